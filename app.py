@@ -1,7 +1,10 @@
 import os
+from datetime import datetime, timedelta
+import click
 from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager # JWTManagerのインポートを追加
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 
 
@@ -16,11 +19,31 @@ def create_app(config_name=None):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # Heroku のルーターや学校の NAT 越しでもクライアントの IP を remote_addr に入れる（ログイン試行制限の IP 単位）
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+    if app.config['LOGIN_RATE_LIMIT_ENABLED']:
+        from utils.rate_limit import validate_config
+        validate_config(app.config)
+    
     # 拡張機能の初期化
-   from extensions import db, migrate
+    from extensions import db, migrate
 
     db.init_app(app)
     migrate.init_app(app, db)
+    
+    # コネクションプールの計測
+    from utils.db_metrics import instrument_engine
+    from utils import db_routing, sql_profiler
+    with app.app_context():
+        engines = [db.engine]
+        if db_routing.replica_configured(app):
+            engines.append(db.get_engine(bind=db_routing.REPLICA_BIND))
+        for engine in engines:
+            instrument_engine(engine)
+        # リクエストごとの SQL 件数・時間と N+1 検出
+        sql_profiler.init_app(app, engines)
+    db_routing.init_app(app)
 
 
     # モデルのインポート
@@ -32,6 +55,10 @@ def create_app(config_name=None):
     from models.textbook import Textbook
     from models.cart import Cart
     from models.order import Order, OrderItem
+    from models.stock_movement import StockMovement, StockSnapshot
+    from models.sales_rollup import DailySales, DailyOrderTotals
+    from models.restock_forecast import RestockForecast
+    from models.revoked_token import RevokedToken, RevokedSubject
     
     # JWT設定
     jwt = JWTManager(app)
@@ -85,9 +112,8 @@ def create_app(config_name=None):
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
         """トークンがブラックリストされているかチェック"""
-        from views.auth import blacklisted_tokens
-        jti = jwt_payload["jti"]
-        return jti in blacklisted_tokens
+        from utils.token_blocklist import token_blocklist
+        return token_blocklist.is_revoked(jwt_payload)
     
     # CORS設定
     CORS(app, origins=["http://localhost:3000", "http://localhost:5000"] )
@@ -105,6 +131,13 @@ def create_app(config_name=None):
     from views.orders import orders_bp
     from views.admin import admin_bp
     
+    # カタログ・レポート・注文履歴の GET はレプリカへ（設定時のみ）
+    db_routing.route_reads(app, {
+        "textbooks": None,
+        "admin": {"sales_report", "inventory_report", "stock_movements", "stock_at"},
+        "orders": {"get_orders", "get_order"},
+    })
+    
     app.register_blueprint(auth_bp, url_prefix="/api/v1/auth")
     app.register_blueprint(school_auth_bp, url_prefix="/api/v1/school-auth")
     app.register_blueprint(textbooks_bp, url_prefix="/api/v1/textbooks")
@@ -185,11 +218,65 @@ def create_app(config_name=None):
         seed_database()
         print("Database seeded with sample data.")
     
+    @app.cli.command()
+    def compact_stock_ledger():
+        """在庫台帳のスナップショット作成と圧縮（定期実行用）"""
+        result = StockSnapshot.compact(retention_days=app.config["STOCK_LEDGER_RETENTION_DAYS"])
+        print(f"Created {result['snapshots']} snapshots, pruned {result['pruned_movements']} movements.")
+    
+    @app.cli.command()
+    @click.option("--days", type=int, default=None, help="直近N日分のみ再構築（省略時は全期間）")
+    def rebuild_daily_sales(days):
+        """日次売上ロールアップを再構築"""
+        start_day = (datetime.utcnow() - timedelta(days=days)).date() if days else None
+        DailySales.rebuild(start_day=start_day)
+        print("Daily sales rollups rebuilt.")
+    
+    @app.cli.command()
+    def prune_report_cache():
+        """古いレポートキャッシュを削除"""
+        from utils.report_jobs import report_jobs
+        removed = report_jobs.prune(app.config["REPORT_CACHE_MAX_AGE"])
+        print(f"Removed {removed} cached report files.")
+    
+    @app.cli.command()
+    @click.option("--season-start", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="発注シーズン開始日（既定は次の4月1日）")
+    def forecast_restock(season_start):
+        """次シーズンの需要予測と推奨発注数を計算"""
+        count = RestockForecast.generate(
+            season_start=season_start.date() if season_start else None,
+            season_weeks=app.config["RESTOCK_SEASON_WEEKS"],
+            history_weeks=app.config["RESTOCK_HISTORY_WEEKS"]
+        )
+        print(f"Forecasted {count} textbooks.")
+    
+    @app.cli.command()
+    def snapshot_analytics():
+        """分析用の列指向スナップショットを作成（夜間バッチ用）"""
+        from utils.analytics import create_snapshot
+        meta = create_snapshot(app.config["ANALYTICS_DATA_DIR"])
+        rows = ", ".join(f"{table}={info['rows']}" for table, info in meta["tables"].items())
+        print(f"Analytics snapshot {meta['snapshot_id']} created ({rows}).")
+    
+    @app.cli.command()
+    def purge_revoked_tokens():
+        """有効期限切れの失効トークンを削除"""
+        removed = RevokedToken.purge_expired()
+        subjects = RevokedSubject.purge_expired()
+        print(f"Purged {removed} expired revoked tokens and {subjects} subject revocations.")
+    
     return app
 
 
 def seed_database():
     """サンプルデータの投入"""
+    from extensions import db
+    from models.base_model import unit_of_work
+    from models.school import School
+    from models.category import Category
+    from models.user import User
+    from models.textbook import Textbook
+    
     try:
         # 学校データ
         schools_data = [
@@ -220,11 +307,12 @@ def seed_database():
         ]
         
         schools = []
-        for school_data in schools_data:
-            if not School.query.filter_by(school_name=school_data["school_name"]).first():
-                school = School(**school_data)
-                school.save()
-                schools.append(school)
+        with unit_of_work():
+            for school_data in schools_data:
+                if not School.query.filter_by(school_name=school_data["school_name"]).first():
+                    school = School(**school_data)
+                    school.save()
+                    schools.append(school)
         
         # カテゴリデータ
         categories_data = [
@@ -237,11 +325,12 @@ def seed_database():
         ]
         
         categories = []
-        for cat_data in categories_data:
-            if not Category.query.filter_by(category_name=cat_data["category_name"]).first():
-                category = Category(**cat_data)
-                category.save()
-                categories.append(category)
+        with unit_of_work():
+            for cat_data in categories_data:
+                if not Category.query.filter_by(category_name=cat_data["category_name"]).first():
+                    category = Category(**cat_data)
+                    category.save()
+                    categories.append(category)
         
         # 管理者ユーザー
         admin_data = {
@@ -253,10 +342,11 @@ def seed_database():
             "role": "admin"
         }
         
+        users = []
         if not User.find_by_email(admin_data["email"]):
             admin = User(**admin_data)
             admin.set_password("admin123")
-            admin.save()
+            users.append(admin)
         
         # サンプル学生ユーザー
         students_data = [
@@ -288,7 +378,8 @@ def seed_database():
             if not User.find_by_email(student_data["email"]):
                 student = User(**student_data)
                 student.set_password("student123")
-                student.save()
+                users.append(student)
+        User.bulk_save(users)
         
         # サンプル教科書データ
         textbooks_data = [
@@ -358,10 +449,12 @@ def seed_database():
             }
         ]
         
-        for textbook_data in textbooks_data:
-            if not Textbook.query.filter_by(title=textbook_data["title"]).first():
-                textbook = Textbook(**textbook_data)
-                textbook.save()
+        existing_titles = {title for (title,) in db.session.query(Textbook.title).filter(
+            Textbook.title.in_([textbook_data["title"] for textbook_data in textbooks_data])
+        )}
+        Textbook.bulk_save([
+            textbook_data for textbook_data in textbooks_data if textbook_data["title"] not in existing_titles
+        ])
         
         print("Sample data inserted successfully!")
         
@@ -80,9 +80,8 @@ def create_app(config_name=None):
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
         """トークンがブラックリストされているかチェック"""
-        from views.auth import blacklisted_tokens
-        jti = jwt_payload['jti']
-        return jti in blacklisted_tokens
+        from utils.token_blocklist import token_blocklist
+        return token_blocklist.is_revoked(jwt_payload)
     
     # CORS設定
     CORS(app, origins=['http://localhost:3000', 'http://localhost:5000'])
@@ -1,8 +1,29 @@
-from flask_sqlalchemy import SQLAlchemy
+from flask import g, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
 from flask_migrate import Migrate
+from sqlalchemy import orm
+from sqlalchemy.sql import Select
 
-db = SQLAlchemy()
-migrate = Migrate()
+REPLICA_BIND = 'replica'
+
+class RoutingSession(SignallingSession):
+    """レプリカ読み取り対象のリクエストでは、ロックなしの SELECT だけをレプリカに送る"""
 
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
 
+    def get_bind(self, mapper=None, clause=None):
+        if (has_request_context() and g.get('use_replica')
+                and not self._flushing
+                and isinstance(clause, Select)
+                and clause._for_update_arg is None):
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper=mapper, clause=clause)
 
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+db = RoutingSQLAlchemy()
+migrate = Migrate()
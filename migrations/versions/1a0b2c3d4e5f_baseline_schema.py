@@ -0,0 +1,141 @@
+"""baseline schema
+
+Revision ID: 1a0b2c3d4e5f
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a0b2c3d4e5f'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _timestamps():
+    return [
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    ]
+
+
+def upgrade():
+    # create_all で作成済みの DB は `flask db stamp 1a0b2c3d4e5f` してから upgrade する
+    op.create_table(
+        'schools',
+        *_timestamps(),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('school_name', sa.String(length=200), nullable=False),
+        sa.Column('prefecture', sa.String(length=50), nullable=False),
+        sa.Column('city', sa.String(length=100), nullable=False),
+        sa.Column('address', sa.Text(), nullable=False),
+        sa.Column('phone', sa.String(length=20), nullable=True),
+        sa.Column('email', sa.String(length=120), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'categories',
+        *_timestamps(),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('category_name', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('category_name')
+    )
+    op.create_table(
+        'users',
+        *_timestamps(),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=255), nullable=False),
+        sa.Column('first_name', sa.String(length=50), nullable=False),
+        sa.Column('last_name', sa.String(length=50), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=True),
+        sa.Column('school_id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.String(length=20), nullable=True),
+        sa.Column('grade', sa.String(length=10), nullable=True),
+        sa.Column('class_name', sa.String(length=20), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['school_id'], ['schools.id']),
+        sa.PrimaryKeyConstraint('user_id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table(
+        'school_auths',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('school_id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=128), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['school_id'], ['schools.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email')
+    )
+    op.create_table(
+        'textbooks',
+        *_timestamps(),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('author', sa.String(length=100), nullable=False),
+        sa.Column('isbn', sa.String(length=20), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('stock_quantity', sa.Integer(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('image_url', sa.String(length=255), nullable=True),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('school_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id']),
+        sa.ForeignKeyConstraint(['school_id'], ['schools.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('isbn')
+    )
+    op.create_table(
+        'carts',
+        *_timestamps(),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('textbook_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['textbook_id'], ['textbooks.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'orders',
+        *_timestamps(),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('order_date', sa.DateTime(), nullable=True),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('shipping_address', sa.Text(), nullable=True),
+        sa.Column('payment_method', sa.String(length=50), nullable=True),
+        sa.Column('payment_status', sa.String(length=20), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'order_items',
+        *_timestamps(),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('textbook_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_price', sa.Float(), nullable=False),
+        sa.Column('total_price', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id']),
+        sa.ForeignKeyConstraint(['textbook_id'], ['textbooks.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    for table in ('order_items', 'orders', 'carts', 'textbooks', 'school_auths', 'users', 'categories', 'schools'):
+        op.drop_table(table)
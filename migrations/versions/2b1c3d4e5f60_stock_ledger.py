@@ -0,0 +1,60 @@
+"""stock movement ledger and snapshots
+
+Revision ID: 2b1c3d4e5f60
+Revises: 1a0b2c3d4e5f
+Create Date: 2026-10-19 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b1c3d4e5f60'
+down_revision = '1a0b2c3d4e5f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stock_movements',
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('textbook_id', sa.Integer(), nullable=False),
+        sa.Column('change', sa.Integer(), nullable=False),
+        sa.Column('reason', sa.String(length=20), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=True),
+        sa.Column('note', sa.String(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id']),
+        sa.ForeignKeyConstraint(['textbook_id'], ['textbooks.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stock_movements_textbook_created', 'stock_movements', ['textbook_id', 'created_at'])
+    op.create_index('ix_stock_movements_created', 'stock_movements', ['created_at'])
+    op.create_table(
+        'stock_snapshots',
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('textbook_id', sa.Integer(), nullable=False),
+        sa.Column('snapshot_at', sa.DateTime(), nullable=False),
+        sa.Column('stock_quantity', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['textbook_id'], ['textbooks.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('textbook_id', 'snapshot_at', name='uq_stock_snapshots_textbook_at')
+    )
+    # 台帳導入前の在庫は移動履歴がないので、現在庫を起点のスナップショットとして残す
+    op.execute("""
+        INSERT INTO stock_snapshots (textbook_id, snapshot_at, stock_quantity, created_at, updated_at)
+        SELECT id, now() AT TIME ZONE 'utc', COALESCE(stock_quantity, 0), now() AT TIME ZONE 'utc', now() AT TIME ZONE 'utc'
+        FROM textbooks
+    """)
+
+
+def downgrade():
+    op.drop_table('stock_snapshots')
+    op.drop_index('ix_stock_movements_created', table_name='stock_movements')
+    op.drop_index('ix_stock_movements_textbook_created', table_name='stock_movements')
+    op.drop_table('stock_movements')
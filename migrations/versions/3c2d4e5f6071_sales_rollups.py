@@ -0,0 +1,57 @@
+"""daily sales and order total rollups
+
+Revision ID: 3c2d4e5f6071
+Revises: 2b1c3d4e5f60
+Create Date: 2026-10-19 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c2d4e5f6071'
+down_revision = '2b1c3d4e5f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 既存注文の集計は `flask rebuild-daily-sales` で埋める
+    op.create_table(
+        'daily_sales',
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('school_id', sa.Integer(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('textbook_id', sa.Integer(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id']),
+        sa.ForeignKeyConstraint(['school_id'], ['schools.id']),
+        sa.ForeignKeyConstraint(['textbook_id'], ['textbooks.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'school_id', 'category_id', 'textbook_id', name='uq_daily_sales_key')
+    )
+    op.create_index('ix_daily_sales_textbook_day', 'daily_sales', ['textbook_id', 'day'])
+    op.create_table(
+        'daily_order_totals',
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('school_id', sa.Integer(), nullable=False),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['school_id'], ['schools.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'school_id', name='uq_daily_order_totals_key')
+    )
+
+
+def downgrade():
+    op.drop_table('daily_order_totals')
+    op.drop_index('ix_daily_sales_textbook_day', table_name='daily_sales')
+    op.drop_table('daily_sales')
@@ -0,0 +1,88 @@
+"""hot path indexes and unique cart lines
+
+Revision ID: 3f9c2a71d4b8
+Revises: 5e4f60718293
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a71d4b8'
+down_revision = '5e4f60718293'
+branch_labels = None
+depends_on = None
+
+# 稼働中のテーブルをロックしないよう CONCURRENTLY で作成する
+INDEXES = [
+    ('ix_orders_user_status_created', 'orders', '(user_id, status, created_at)'),
+    ('ix_order_items_order_id', 'order_items', '(order_id)'),
+    ('ix_order_items_textbook_id', 'order_items', '(textbook_id)'),
+    ('ix_textbooks_school_category', 'textbooks', '(school_id, category_id)'),
+    ('ix_textbooks_low_stock', 'textbooks', '(stock_quantity, id) WHERE stock_quantity <= 10'),
+    # users(school_id, role) は ix_users_roster の先頭列で兼ねる
+    ('ix_users_roster', 'users', '(school_id, role, grade, class_name, user_id)'),
+    ('ix_users_last_name_prefix', 'users', '(last_name varchar_pattern_ops)'),
+    ('ix_users_first_name_prefix', 'users', '(first_name varchar_pattern_ops)'),
+    ('ix_users_student_id_prefix', 'users', '(student_id varchar_pattern_ops)'),
+    ('ix_users_email_prefix', 'users', '(email varchar_pattern_ops)'),
+]
+
+
+def _drop_invalid_indexes(names):
+    """CONCURRENTLY の失敗で残った INVALID なインデックスを落とす（IF NOT EXISTS では作り直されないため）"""
+    invalid = op.get_bind().execute(sa.text("""
+        SELECT c.relname FROM pg_index AS i
+        JOIN pg_class AS c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid AND c.relname = ANY(:names)
+    """), {'names': list(names)}).scalars().all()
+    for name in invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def upgrade():
+    # 重複しているカート行を数量を合算して1行にまとめる
+    op.execute("""
+        UPDATE carts AS c SET quantity = d.quantity
+        FROM (
+            SELECT MIN(id) AS id, SUM(quantity) AS quantity
+            FROM carts GROUP BY user_id, textbook_id HAVING COUNT(*) > 1
+        ) AS d
+        WHERE c.id = d.id
+    """)
+    op.execute("""
+        DELETE FROM carts AS c
+        USING carts AS keep
+        WHERE keep.user_id = c.user_id AND keep.textbook_id = c.textbook_id AND keep.id < c.id
+    """)
+
+    with op.get_context().autocommit_block():
+        _drop_invalid_indexes(['uq_carts_user_textbook'] + [name for name, _, _ in INDEXES])
+        op.execute(
+            'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_carts_user_textbook ON carts (user_id, textbook_id)'
+        )
+        for name, table, columns in INDEXES:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {columns}')
+
+    # create_all で作られた DB には制約が既にある
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint
+                WHERE conname = 'uq_carts_user_textbook' AND conrelid = 'carts'::regclass
+            ) THEN
+                ALTER TABLE carts ADD CONSTRAINT uq_carts_user_textbook UNIQUE USING INDEX uq_carts_user_textbook;
+            END IF;
+        END
+        $$
+    """)
+
+
+def downgrade():
+    op.drop_constraint('uq_carts_user_textbook', 'carts', type_='unique')
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
@@ -0,0 +1,41 @@
+"""restock forecasts
+
+Revision ID: 4d3e5f607182
+Revises: 3c2d4e5f6071
+Create Date: 2026-10-19 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d3e5f607182'
+down_revision = '3c2d4e5f6071'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'restock_forecasts',
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('textbook_id', sa.Integer(), nullable=False),
+        sa.Column('season_start', sa.Date(), nullable=False),
+        sa.Column('season_weeks', sa.Integer(), nullable=False),
+        sa.Column('forecast_units', sa.Float(), nullable=False),
+        sa.Column('safety_stock', sa.Float(), nullable=False),
+        sa.Column('current_stock', sa.Integer(), nullable=False),
+        sa.Column('recommended_order', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['textbook_id'], ['textbooks.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('textbook_id')
+    )
+    op.create_index('ix_restock_forecasts_recommended', 'restock_forecasts', ['recommended_order'])
+
+
+def downgrade():
+    op.drop_index('ix_restock_forecasts_recommended', table_name='restock_forecasts')
+    op.drop_table('restock_forecasts')
@@ -0,0 +1,35 @@
+"""revoked tokens
+
+Revision ID: 5e4f60718293
+Revises: 4d3e5f607182
+Create Date: 2026-10-19 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e4f60718293'
+down_revision = '4d3e5f607182'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'revoked_tokens',
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jti', sa.String(length=64), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('jti')
+    )
+    op.create_index('ix_revoked_tokens_expires_at', 'revoked_tokens', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_revoked_tokens_expires_at', table_name='revoked_tokens')
+    op.drop_table('revoked_tokens')
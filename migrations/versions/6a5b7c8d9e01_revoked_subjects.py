@@ -0,0 +1,49 @@
+"""move subject revocations out of revoked_tokens
+
+Revision ID: 6a5b7c8d9e01
+Revises: 3f9c2a71d4b8
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a5b7c8d9e01'
+down_revision = '3f9c2a71d4b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'revoked_subjects',
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('subject', sa.String(length=64), nullable=False),
+        sa.Column('revoked_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('subject')
+    )
+    op.create_index('ix_revoked_subjects_revoked_at', 'revoked_subjects', ['revoked_at'])
+    op.create_index('ix_revoked_subjects_expires_at', 'revoked_subjects', ['expires_at'])
+    # これまでは jti 列に 'subject:<種別>:<ID>'、失効時刻を created_at に入れていた
+    op.execute("""
+        INSERT INTO revoked_subjects (subject, revoked_at, expires_at, created_at, updated_at)
+        SELECT substr(jti, 9), created_at, expires_at, created_at, updated_at
+        FROM revoked_tokens WHERE jti LIKE 'subject:%'
+    """)
+    op.execute("DELETE FROM revoked_tokens WHERE jti LIKE 'subject:%'")
+
+
+def downgrade():
+    op.execute("""
+        INSERT INTO revoked_tokens (jti, expires_at, created_at, updated_at)
+        SELECT 'subject:' || subject, expires_at, revoked_at, updated_at FROM revoked_subjects
+    """)
+    op.drop_index('ix_revoked_subjects_expires_at', table_name='revoked_subjects')
+    op.drop_index('ix_revoked_subjects_revoked_at', table_name='revoked_subjects')
+    op.drop_table('revoked_subjects')
@@ -5,3 +5,6 @@ from .school import School
 from .textbook import Textbook # ここをBookからTextbookに修正
 from .order import Order, OrderItem
 from .cart import Cart
+from .stock_movement import StockMovement, StockSnapshot
+from .sales_rollup import DailySales, DailyOrderTotals
+from .revoked_token import RevokedToken, RevokedSubject
@@ -1,6 +1,30 @@
+from contextlib import contextmanager
 from datetime import datetime
 from extensions import db
 
+def in_unit_of_work():
+    return db.session.info.get('unit_of_work_depth', 0) > 0
+
+@contextmanager
+def unit_of_work():
+    """ブロック内の save / delete / bulk_* をまとめて1回だけコミット（入れ子可、例外時はロールバック）"""
+    info = db.session.info
+    info['unit_of_work_depth'] = info.get('unit_of_work_depth', 0) + 1
+    try:
+        yield db.session
+        if info['unit_of_work_depth'] == 1:
+            db.session.commit()
+    except Exception:
+        if info['unit_of_work_depth'] == 1:
+            db.session.rollback()
+        raise
+    finally:
+        info['unit_of_work_depth'] -= 1
+
+def _finish(commit):
+    if commit and not in_unit_of_work():
+        db.session.commit()
+
 class BaseModel(db.Model):
     """全モデルの基底クラス"""
     __abstract__ = True
@@ -8,20 +32,44 @@ class BaseModel(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    def save(self):
-        """レコードを保存"""
+    def save(self, commit=True):
+        """レコードを保存（unit_of_work 内または commit=False ではコミットしない）"""
         db.session.add(self)
-        db.session.commit()
+        _finish(commit)
         return self
     
-    def delete(self):
-        """レコードを削除"""
+    def delete(self, commit=True):
+        """レコードを削除（unit_of_work 内または commit=False ではコミットしない）"""
         db.session.delete(self)
-        db.session.commit()
+        _finish(commit)
+    
+    @classmethod
+    def bulk_save(cls, objects, commit=True):
+        """複数レコードを一括 INSERT（dict は bulk_insert_mappings、インスタンスは bulk_save_objects）"""
+        objects = list(objects)
+        mappings = [obj for obj in objects if isinstance(obj, dict)]
+        instances = [obj for obj in objects if not isinstance(obj, dict)]
+        if mappings:
+            now = datetime.utcnow()
+            for mapping in mappings:
+                mapping.setdefault('created_at', now)
+                mapping.setdefault('updated_at', now)
+            db.session.bulk_insert_mappings(cls, mappings)
+        if instances:
+            db.session.bulk_save_objects(instances)
+        _finish(commit)
+        return len(objects)
+    
+    @classmethod
+    def bulk_delete(cls, *criteria, commit=True):
+        """条件に合うレコードを1回の DELETE で削除（削除件数を返す）"""
+        deleted = cls.query.filter(*criteria).delete(synchronize_session=False)
+        _finish(commit)
+        return deleted
     
     def to_dict(self):
         """辞書形式に変換（基本実装）"""
         return {
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+        }
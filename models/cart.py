@@ -1,11 +1,18 @@
 from extensions import db
-from models.base_model import BaseModel
+from models.base_model import BaseModel, _finish
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import joinedload
 
 class Cart(BaseModel ):
     __tablename__ = 'carts'
+    __table_args__ = (
+        # 1ユーザー1教科書1行（add_item の ON CONFLICT の対象）
+        db.UniqueConstraint('user_id', 'textbook_id', name='uq_carts_user_textbook'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
     textbook_id = db.Column(db.Integer, db.ForeignKey('textbooks.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
     
@@ -13,6 +20,106 @@ class Cart(BaseModel ):
     user = db.relationship('User', backref='cart_items')
     textbook = db.relationship('Textbook', backref='cart_items')
     
+    OPERATIONS = ('add', 'set', 'remove')
+    
+    @classmethod
+    def get_user_cart(cls, user_id):
+        """カート内容を教科書と一緒に取得"""
+        return cls.query.options(joinedload(cls.textbook)).filter_by(user_id=user_id).order_by(cls.id).all()
+    
+    @classmethod
+    def add_item(cls, user_id, textbook_id, quantity=1, commit=True):
+        """カートに追加（既存行があれば数量を加算）。事前の SELECT なしで1文の UPSERT"""
+        now = datetime.utcnow()
+        stmt = pg_insert(cls.__table__).values(
+            user_id=user_id, textbook_id=textbook_id, quantity=quantity, created_at=now, updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint='uq_carts_user_textbook',
+            set_={'quantity': cls.__table__.c.quantity + stmt.excluded.quantity, 'updated_at': now}
+        ).returning(*cls.__table__.c)
+        cart_item = db.session.execute(
+            db.select(cls).from_statement(stmt).execution_options(populate_existing=True)
+        ).scalar_one()
+        _finish(commit)
+        return cart_item
+    
+    @classmethod
+    def get_cart_total(cls, user_id):
+        """カート合計金額"""
+        from models.textbook import Textbook
+        total = db.session.query(db.func.coalesce(db.func.sum(Textbook.price * cls.quantity), 0)).join(
+            Textbook, cls.textbook_id == Textbook.id
+        ).filter(cls.user_id == user_id).scalar()
+        return total or 0
+    
+    @classmethod
+    def get_cart_item_count(cls, user_id):
+        """カート内の合計冊数"""
+        count = db.session.query(db.func.coalesce(db.func.sum(cls.quantity), 0)).filter(
+            cls.user_id == user_id
+        ).scalar()
+        return int(count or 0)
+    
+    @staticmethod
+    def summarize(cart_items):
+        """読み込み済みのカート行から合計を計算"""
+        return {
+            'cart_items': [item.to_dict() for item in cart_items],
+            'total_amount': float(sum(item.textbook.price * item.quantity for item in cart_items if item.textbook)),
+            'total_items': sum(item.quantity for item in cart_items)
+        }
+    
+    @classmethod
+    def apply_operations(cls, user_id, operations, commit=True):
+        """add/set/remove 操作をまとめて検証し、1トランザクションで反映"""
+        from models.textbook import Textbook
+        textbook_ids = {op['textbook_id'] for op in operations}
+        
+        # 参照される教科書の在庫を1クエリで取得
+        textbooks = {tb.id: tb for tb in Textbook.query.filter(Textbook.id.in_(textbook_ids)).all()}
+        missing = textbook_ids - set(textbooks)
+        if missing:
+            raise ValueError(f'Textbook not found: {sorted(missing)}')
+        
+        lines = {item.textbook_id: item for item in cls.query.filter(
+            cls.user_id == user_id,
+            cls.textbook_id.in_(textbook_ids)
+        ).all()}
+        quantities = {textbook_id: item.quantity for textbook_id, item in lines.items()}
+        
+        for op in operations:
+            textbook_id = op['textbook_id']
+            if op['op'] == 'add':
+                quantities[textbook_id] = quantities.get(textbook_id, 0) + op.get('quantity', 1)
+            elif op['op'] == 'set':
+                quantities[textbook_id] = op['quantity']
+            elif op['op'] == 'remove':
+                quantities[textbook_id] = 0
+            else:
+                raise ValueError(f'Invalid cart operation: {op["op"]}')
+        
+        insufficient = [
+            textbooks[textbook_id].title
+            for textbook_id, quantity in quantities.items()
+            if quantity > (textbooks[textbook_id].stock_quantity or 0)
+        ]
+        if insufficient:
+            raise ValueError(f'Insufficient stock for {", ".join(insufficient)}')
+        
+        for textbook_id, quantity in quantities.items():
+            line = lines.get(textbook_id)
+            if quantity <= 0:
+                if line:
+                    db.session.delete(line)
+            elif line:
+                line.quantity = quantity
+            else:
+                db.session.add(cls(user_id=user_id, textbook_id=textbook_id, quantity=quantity))
+        
+        _finish(commit)
+        return cls.get_user_cart(user_id)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -1,12 +1,19 @@
 from extensions import db
-from models.base_model import BaseModel
+from sqlalchemy.orm import selectinload, load_only
+from models.base_model import BaseModel, _finish
+from models.stock_movement import StockMovement
+from models.sales_rollup import DailySales, DailyOrderTotals
 from datetime import datetime
 
 class Order(BaseModel):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # ユーザー別・ステータス別の注文履歴
+        db.Index('ix_orders_user_status_created', 'user_id', 'status', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
     order_date = db.Column(db.DateTime, default=datetime.utcnow)
     total_amount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(20), default='pending')
@@ -17,6 +24,214 @@ class Order(BaseModel):
     user = db.relationship('User', backref='orders')
     order_items = db.relationship('OrderItem', backref='order', cascade='all, delete-orphan')
     
+    CANCELLABLE_STATUSES = ('pending', 'confirmed')
+    # 許可されるステータス遷移（キャンセルは在庫戻しを伴うため cancel_order で行う）
+    ALLOWED_TRANSITIONS = {
+        'pending': ('confirmed',),
+        'confirmed': ('shipped',),
+        'shipped': ('delivered',),
+    }
+    
+    @classmethod
+    def statuses_allowed_into(cls, status):
+        """指定ステータスへ遷移可能な元ステータス"""
+        return [source for source, targets in cls.ALLOWED_TRANSITIONS.items() if status in targets]
+    
+    def update_status(self, status, notes=None, commit=True):
+        """注文ステータス更新"""
+        if status == 'cancelled':
+            return self.cancel_order(notes, commit=commit)
+        if status not in self.ALLOWED_TRANSITIONS.get(self.status, ()):
+            raise ValueError(f'Cannot change status from {self.status} to {status}')
+        self.status = status
+        _finish(commit)
+        return self
+    
+    @classmethod
+    def _bulk_conditions(cls, order_ids=None, user_id=None, start_date=None, end_date=None):
+        """一括操作の対象条件"""
+        conditions = []
+        if order_ids is not None:
+            conditions.append(cls.id.in_(order_ids))
+        if user_id:
+            conditions.append(cls.user_id == user_id)
+        if start_date:
+            conditions.append(cls.created_at >= start_date)
+        if end_date:
+            conditions.append(cls.created_at < end_date)
+        return conditions
+    
+    @classmethod
+    def _bulk_outcomes(cls, order_ids, updated, result='updated', user_id=None):
+        """ID ごとの結果（対象外の理由は1クエリで判定）"""
+        outcomes = {order_id: result for order_id in updated}
+        if order_ids is not None:
+            skipped = set(order_ids) - set(updated)
+            current = {}
+            if skipped:
+                query = db.session.query(cls.id, cls.status).filter(cls.id.in_(skipped))
+                if user_id:
+                    query = query.filter(cls.user_id == user_id)
+                current = dict(query.all())
+            for order_id in skipped:
+                if order_id not in current:
+                    outcomes[order_id] = 'not_found'
+                else:
+                    outcomes[order_id] = f'invalid_transition_from_{current[order_id]}'
+        return outcomes
+    
+    @classmethod
+    def bulk_transition(cls, status, order_ids=None, from_status=None, user_id=None, start_date=None, end_date=None,
+                        commit=True):
+        """ステータスを一括遷移（UPDATE ... WHERE status IN 許可元 RETURNING id）"""
+        sources = cls.statuses_allowed_into(status)
+        if from_status:
+            sources = [source for source in sources if source == from_status]
+        if not sources:
+            raise ValueError(f'No order can be changed to {status}' + (f' from {from_status}' if from_status else ''))
+        
+        conditions = [cls.status.in_(sources)]
+        conditions += cls._bulk_conditions(order_ids, user_id, start_date, end_date)
+        
+        result = db.session.execute(
+            db.update(cls)
+            .where(*conditions)
+            .values(status=status, updated_at=datetime.utcnow())
+            .returning(cls.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated = [row.id for row in result]
+        outcomes = cls._bulk_outcomes(order_ids, updated, user_id=user_id)
+        
+        _finish(commit)
+        return outcomes
+    
+    @classmethod
+    def bulk_cancel(cls, order_ids=None, user_id=None, start_date=None, end_date=None, reason=None, commit=True):
+        """注文を一括キャンセルし、教科書ごとに集計した数量で在庫を戻す"""
+        from models.textbook import Textbook
+        conditions = [cls.status.in_(cls.CANCELLABLE_STATUSES)]
+        conditions += cls._bulk_conditions(order_ids, user_id, start_date, end_date)
+        
+        # 先にステータスを遷移させ、実際にキャンセルされた注文だけを在庫戻しの対象にする
+        result = db.session.execute(
+            db.update(cls)
+            .where(*conditions)
+            .values(status='cancelled', updated_at=datetime.utcnow())
+            .returning(cls.id)
+            .execution_options(synchronize_session=False)
+        )
+        cancelled = [row.id for row in result]
+        
+        if cancelled:
+            # 教科書ごとの戻し数量を GROUP BY で集計し、UPDATE ... FROM で1文で反映
+            restock = db.session.query(
+                OrderItem.textbook_id.label('textbook_id'),
+                db.func.sum(OrderItem.quantity).label('quantity')
+            ).filter(OrderItem.order_id.in_(cancelled)).group_by(OrderItem.textbook_id).subquery()
+            db.session.execute(
+                db.update(Textbook)
+                .where(Textbook.id == restock.c.textbook_id)
+                .values(stock_quantity=Textbook.stock_quantity + restock.c.quantity)
+                .execution_options(synchronize_session=False)
+            )
+            StockMovement.record_for_orders(cancelled, 'cancel', note=reason)
+            DailySales.record_orders(cancelled, sign=-1)
+        
+        outcomes = cls._bulk_outcomes(order_ids, cancelled, result='cancelled', user_id=user_id)
+        _finish(commit)
+        return outcomes
+    
+    def cancel_order(self, reason=None, commit=True):
+        """注文キャンセル（在庫を戻して台帳に記録）"""
+        if self.status not in self.CANCELLABLE_STATUSES:
+            raise ValueError(f'Order cannot be cancelled in status: {self.status}')
+        
+        outcomes = Order.bulk_cancel(order_ids=[self.id], reason=reason, commit=commit)
+        if outcomes.get(self.id) != 'cancelled':
+            raise ValueError('Order was changed by another request')
+        db.session.refresh(self)
+        return self
+    
+    REPORT_BREAKDOWNS = ('school', 'category', 'textbook')
+    
+    @classmethod
+    def sales_totals(cls, start_date, end_date=None):
+        """期間内の売上合計・件数・平均（日次ロールアップから集計）"""
+        return DailyOrderTotals.totals(start_date, end_date)
+    
+    @classmethod
+    def sales_series(cls, start_date, end_date=None, bucket='day', breakdown=None):
+        """期間バケット（日/週/月）ごとの売上推移。学校別は注文数、カテゴリ・教科書別は冊数を返す"""
+        if breakdown and breakdown not in cls.REPORT_BREAKDOWNS:
+            raise ValueError(f'breakdown must be one of {", ".join(cls.REPORT_BREAKDOWNS)}')
+        if breakdown in (None, 'school'):
+            return DailyOrderTotals.series(start_date, end_date, bucket=bucket, by_school=breakdown == 'school')
+        return DailySales.series(start_date, end_date, bucket=bucket, breakdown=breakdown)
+    
+    EXPORT_COLUMNS = (
+        'order_id', 'ordered_at', 'status', 'user_id', 'school_id', 'school_name',
+        'order_item_id', 'textbook_id', 'isbn', 'title', 'quantity', 'unit_price', 'total_price'
+    )
+    
+    @classmethod
+    def export_lines(cls, start_date=None, end_date=None, status=None, chunk_size=2000):
+        """注文明細行を学校・教科書と結合し、サーバーサイドカーソルでチャンクごとに返す"""
+        from models.school import School
+        from models.textbook import Textbook
+        from models.user import User
+        stmt = db.select(
+            cls.id, cls.created_at, cls.status, cls.user_id, User.school_id, School.school_name,
+            OrderItem.id, OrderItem.textbook_id, Textbook.isbn, Textbook.title,
+            OrderItem.quantity, OrderItem.unit_price, OrderItem.total_price
+        ).select_from(cls).join(
+            OrderItem, OrderItem.order_id == cls.id
+        ).join(
+            Textbook, Textbook.id == OrderItem.textbook_id
+        ).outerjoin(
+            User, User.user_id == cls.user_id
+        ).outerjoin(
+            School, School.id == User.school_id
+        ).where(*cls._bulk_conditions(start_date=start_date, end_date=end_date))
+        if status:
+            stmt = stmt.where(cls.status == status)
+        stmt = stmt.order_by(cls.created_at, cls.id, OrderItem.id)
+        
+        result = db.session.execute(stmt.execution_options(stream_results=True, max_row_buffer=chunk_size))
+        for partition in result.partitions(chunk_size):
+            for row in partition:
+                yield tuple(row)
+    
+    @classmethod
+    def search(cls, user_id=None, status=None, start_date=None, end_date=None, include_items=False):
+        """注文検索（新しい順）"""
+        query = cls.query
+        if user_id:
+            query = query.filter(cls.user_id == user_id)
+        if status:
+            query = query.filter(cls.status == status)
+        if start_date:
+            query = query.filter(cls.created_at >= start_date)
+        if end_date:
+            query = query.filter(cls.created_at < end_date)
+        if include_items:
+            query = query.options(cls.items_loader())
+        return query.order_by(cls.created_at.desc(), cls.id.desc())
+    
+    @staticmethod
+    def items_loader():
+        """明細と教科書名を1往復で読み込むローダーオプション"""
+        from models.textbook import Textbook
+        return selectinload(Order.order_items).joinedload(OrderItem.textbook).options(
+            load_only(Textbook.id, Textbook.title)
+        )
+    
+    def to_dict_with_items(self):
+        """明細付きで辞書形式に変換"""
+        order_data = self.to_dict()
+        order_data['items'] = [item.to_dict(include_title=True) for item in self.order_items]
+        return order_data
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -33,6 +248,10 @@ class Order(BaseModel):
 
 class OrderItem(BaseModel):
     __tablename__ = 'order_items'
+    __table_args__ = (
+        db.Index('ix_order_items_order_id', 'order_id'),
+        db.Index('ix_order_items_textbook_id', 'textbook_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
@@ -43,8 +262,8 @@ class OrderItem(BaseModel):
     
     textbook = db.relationship('Textbook', backref='order_items')
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_title=False):
+        data = {
             'id': self.id,
             'order_id': self.order_id,
             'textbook_id': self.textbook_id,
@@ -53,4 +272,7 @@ class OrderItem(BaseModel):
             'total_price': self.total_price,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+        }
+        if include_title:
+            data['textbook_title'] = self.textbook.title if self.textbook else None
+        return data
\ No newline at end of file
@@ -0,0 +1,100 @@
+from datetime import date, datetime
+import numpy as np
+from extensions import db
+from models.base_model import BaseModel, _finish
+
+class RestockForecast(BaseModel):
+    """次シーズンの需要予測と推奨発注数（教科書ごと、最新の実行結果のみ保持）"""
+    __tablename__ = 'restock_forecasts'
+    __table_args__ = (
+        db.Index('ix_restock_forecasts_recommended', 'recommended_order'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    textbook_id = db.Column(db.Integer, db.ForeignKey('textbooks.id'), nullable=False, unique=True)
+    season_start = db.Column(db.Date, nullable=False)
+    season_weeks = db.Column(db.Integer, nullable=False)
+    forecast_units = db.Column(db.Float, nullable=False)
+    safety_stock = db.Column(db.Float, nullable=False)
+    current_stock = db.Column(db.Integer, nullable=False)
+    recommended_order = db.Column(db.Integer, nullable=False)
+
+    textbook = db.relationship('Textbook')
+
+    @staticmethod
+    def _load_history(start_day, chunk_size=50000):
+        """日次ロールアップを (教科書ID, 経過日数, 冊数) の配列として読み込む（学校は SQL で合算）"""
+        from models.sales_rollup import DailySales
+        offset = (DailySales.day - db.literal(start_day, db.Date)).label('offset')
+        stmt = db.select(
+            DailySales.textbook_id,
+            offset,
+            db.func.sum(DailySales.units)
+        ).where(DailySales.day >= start_day).group_by(DailySales.textbook_id, offset)
+        result = db.session.execute(stmt.execution_options(stream_results=True, max_row_buffer=chunk_size))
+        chunks = [np.array(partition, dtype=np.int64) for partition in result.partitions(chunk_size)]
+        if not chunks:
+            return np.empty((0, 3), dtype=np.int64)
+        return np.concatenate(chunks)
+
+    @classmethod
+    def generate(cls, season_start=None, season_weeks=8, history_weeks=104, z=1.65, today=None, commit=True):
+        """需要予測を一括計算して restock_forecasts を置き換える"""
+        from models.textbook import Textbook
+        from utils import forecasting
+        today = today or date.today()
+        season_start = season_start or forecasting.next_season_start(today)
+        start_day = forecasting.history_start(history_weeks, today)
+        lead_weeks = max((season_start - today).days // 7, 0)
+
+        rows = cls._load_history(start_day)
+        cls.query.delete(synchronize_session=False)
+        if len(rows) == 0:
+            _finish(commit)
+            return 0
+
+        weeks = forecasting.week_index(rows[:, 1])
+        titles, matrix = forecasting.weekly_demand_matrix(rows[:, 0], weeks, rows[:, 2], history_weeks)
+        forecast, safety = forecasting.forecast_demand(matrix, lead_weeks, season_weeks, z=z)
+
+        # 現在庫を教科書IDの並びに合わせる
+        stock_rows = np.array(db.session.query(Textbook.id, Textbook.stock_quantity).all(), dtype=np.int64)
+        stock = np.zeros(len(titles), dtype=np.int64)
+        if len(stock_rows):
+            order = np.argsort(stock_rows[:, 0])
+            ids, quantities = stock_rows[order, 0], stock_rows[order, 1]
+            positions = np.clip(np.searchsorted(ids, titles), 0, len(ids) - 1)
+            found = ids[positions] == titles
+            stock[found] = quantities[positions[found]]
+        recommended = forecasting.recommend_orders(forecast, safety, stock)
+
+        now = datetime.utcnow()
+        mappings = [{
+            'textbook_id': int(textbook_id),
+            'season_start': season_start,
+            'season_weeks': season_weeks,
+            'forecast_units': float(forecast_units),
+            'safety_stock': float(safety_stock),
+            'current_stock': int(current_stock),
+            'recommended_order': int(recommended_order),
+            'created_at': now,
+            'updated_at': now
+        } for textbook_id, forecast_units, safety_stock, current_stock, recommended_order
+            in zip(titles.tolist(), forecast.tolist(), safety.tolist(), stock.tolist(), recommended.tolist())]
+        for i in range(0, len(mappings), 10000):
+            db.session.execute(cls.__table__.insert(), mappings[i:i + 10000])
+        _finish(commit)
+        return len(mappings)
+
+    def to_dict(self):
+        return {
+            'textbook_id': self.textbook_id,
+            'title': self.textbook.title if self.textbook else None,
+            'season_start': self.season_start.isoformat() if self.season_start else None,
+            'season_weeks': self.season_weeks,
+            'forecast_units': self.forecast_units,
+            'safety_stock': self.safety_stock,
+            'current_stock': self.current_stock,
+            'recommended_order': self.recommended_order,
+            'generated_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,83 @@
+from datetime import datetime
+from extensions import db
+from models.base_model import BaseModel, _finish
+
+class RevokedToken(BaseModel):
+    """失効させた JWT（jti）。トークン本来の有効期限を過ぎたら削除してよい"""
+    __tablename__ = 'revoked_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(64), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    @classmethod
+    def revoke(cls, jti, expires_at, commit=True):
+        """jti を失効リストに登録（登録済みなら何もしない）"""
+        if not cls.query.filter_by(jti=jti).first():
+            db.session.add(cls(jti=jti, expires_at=expires_at))
+            _finish(commit)
+
+    @classmethod
+    def is_revoked(cls, jti):
+        return db.session.query(
+            cls.query.filter(cls.jti == jti, cls.expires_at > datetime.utcnow()).exists()
+        ).scalar()
+
+    @classmethod
+    def active_jtis(cls, since=None):
+        """有効期限内の jti（since 指定時はそれ以降に登録された分のみ）"""
+        query = db.session.query(cls.jti).filter(cls.expires_at > datetime.utcnow())
+        if since:
+            query = query.filter(cls.created_at >= since)
+        return [jti for (jti,) in query]
+
+    @classmethod
+    def purge_expired(cls, commit=True):
+        """有効期限切れのエントリを削除"""
+        deleted = cls.query.filter(cls.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+        _finish(commit)
+        return deleted
+
+class RevokedSubject(BaseModel):
+    """利用者単位の失効（subject は '<トークン種別>:<ID>'）。revoked_at 以前に発行されたトークンをすべて無効にする"""
+    __tablename__ = 'revoked_subjects'
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(64), unique=True, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    @classmethod
+    def revoke(cls, subject, expires_at, commit=True):
+        """失効時刻を現在にする（再失効時は時刻と保持期限を更新）"""
+        now = datetime.utcnow()
+        entry = cls.query.filter_by(subject=subject).first()
+        if entry:
+            entry.revoked_at = now
+            entry.expires_at = max(entry.expires_at, expires_at)
+        else:
+            db.session.add(cls(subject=subject, revoked_at=now, expires_at=expires_at))
+        _finish(commit)
+        return now
+
+    @classmethod
+    def revoked_at_for(cls, subject):
+        """失効時刻（無ければ None）"""
+        return db.session.query(cls.revoked_at).filter(
+            cls.subject == subject, cls.expires_at > datetime.utcnow()
+        ).scalar()
+
+    @classmethod
+    def active_subjects(cls, since=None):
+        """有効期限内の subject（since 指定時はそれ以降に失効・再失効した分のみ）"""
+        query = db.session.query(cls.subject).filter(cls.expires_at > datetime.utcnow())
+        if since:
+            query = query.filter(cls.revoked_at >= since)
+        return [subject for (subject,) in query]
+
+    @classmethod
+    def purge_expired(cls, commit=True):
+        """有効期限切れのエントリを削除"""
+        deleted = cls.query.filter(cls.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+        _finish(commit)
+        return deleted
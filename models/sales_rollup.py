@@ -0,0 +1,273 @@
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from extensions import db
+from models.base_model import BaseModel, _finish
+
+REPORT_BUCKETS = ('day', 'week', 'month')
+
+def _bucket_column(bucket, day_column):
+    if bucket not in REPORT_BUCKETS:
+        raise ValueError(f'bucket must be one of {", ".join(REPORT_BUCKETS)}')
+    return db.func.date_trunc(bucket, day_column).label('period')
+
+def _upsert(table, columns, select, key_constraint, additive):
+    """INSERT ... SELECT ... ON CONFLICT DO UPDATE で加算"""
+    stmt = pg_insert(table).from_select(columns, select)
+    set_ = {name: table.c[name] + stmt.excluded[name] for name in additive}
+    set_['updated_at'] = stmt.excluded.updated_at
+    db.session.execute(stmt.on_conflict_do_update(constraint=key_constraint, set_=set_))
+
+class DailySales(BaseModel):
+    """日次売上ロールアップ（学校・カテゴリ・教科書別の冊数と金額）"""
+    __tablename__ = 'daily_sales'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'school_id', 'category_id', 'textbook_id', name='uq_daily_sales_key'),
+        db.Index('ix_daily_sales_textbook_day', 'textbook_id', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    textbook_id = db.Column(db.Integer, db.ForeignKey('textbooks.id'), nullable=False)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+
+    BREAKDOWNS = ('school', 'category', 'textbook')
+
+    @classmethod
+    def _apply(cls, condition, sign):
+        from models.order import Order, OrderItem
+        from models.textbook import Textbook
+        from models.user import User
+        now = datetime.utcnow()
+        day = db.func.date(Order.created_at)
+        select = db.select(
+            day,
+            User.school_id,
+            Textbook.category_id,
+            OrderItem.textbook_id,
+            db.func.sum(OrderItem.quantity) * sign,
+            db.func.sum(OrderItem.total_price) * sign,
+            db.literal(now, db.DateTime),
+            db.literal(now, db.DateTime)
+        ).select_from(OrderItem).join(
+            Order, Order.id == OrderItem.order_id
+        ).join(
+            User, User.user_id == Order.user_id
+        ).join(
+            Textbook, Textbook.id == OrderItem.textbook_id
+        ).where(condition).group_by(day, User.school_id, Textbook.category_id, OrderItem.textbook_id)
+        _upsert(
+            cls.__table__,
+            ['day', 'school_id', 'category_id', 'textbook_id', 'units', 'amount', 'created_at', 'updated_at'],
+            select,
+            'uq_daily_sales_key',
+            ('units', 'amount')
+        )
+
+    @classmethod
+    def record_orders(cls, order_ids, sign=1):
+        """注文の作成(+1)・キャンセル(-1)をロールアップに反映（コミットは呼び出し側）"""
+        from models.order import Order
+        if not order_ids:
+            return
+        condition = Order.id.in_(order_ids)
+        cls._apply(condition, sign)
+        DailyOrderTotals._apply(condition, sign)
+
+    @classmethod
+    def rebuild(cls, start_day=None, end_day=None, commit=True):
+        """ロールアップを orders / order_items から再構築（バックフィル用）"""
+        from models.order import Order
+        for model in (cls, DailyOrderTotals):
+            query = model.query
+            if start_day:
+                query = query.filter(model.day >= start_day)
+            if end_day:
+                query = query.filter(model.day < end_day)
+            query.delete(synchronize_session=False)
+
+        day = db.func.date(Order.created_at)
+        conditions = [Order.status != 'cancelled']
+        if start_day:
+            conditions.append(day >= start_day)
+        if end_day:
+            conditions.append(day < end_day)
+        condition = db.and_(*conditions)
+        cls._apply(condition, 1)
+        DailyOrderTotals._apply(condition, 1)
+        _finish(commit)
+
+    @classmethod
+    def popularity_subquery(cls, days=30):
+        """直近 N 日の教科書別販売冊数（カタログの人気順ソート用）"""
+        start_day = (datetime.utcnow() - timedelta(days=days)).date()
+        return db.session.query(
+            cls.textbook_id.label('textbook_id'),
+            db.func.sum(cls.units).label('units')
+        ).filter(cls.day >= start_day).group_by(cls.textbook_id).subquery()
+
+    @classmethod
+    def top_textbooks(cls, days=30, school_id=None, category_id=None, grade=None, limit=10):
+        """直近 N 日の売れ筋教科書（GROUP BY + LIMIT）"""
+        from models.order import Order, OrderItem
+        from models.textbook import Textbook
+        from models.user import User
+        start_day = (datetime.utcnow() - timedelta(days=days)).date()
+
+        if grade:
+            # 学年はロールアップの軸にないため明細から集計
+            units = db.func.sum(OrderItem.quantity).label('units')
+            query = db.session.query(
+                OrderItem.textbook_id.label('textbook_id'),
+                units,
+                db.func.sum(OrderItem.total_price).label('amount')
+            ).join(Order, Order.id == OrderItem.order_id).join(
+                User, User.user_id == Order.user_id
+            ).filter(
+                Order.created_at >= start_day,
+                Order.status != 'cancelled',
+                User.grade == grade
+            )
+            if school_id:
+                query = query.filter(User.school_id == school_id)
+            if category_id:
+                query = query.join(Textbook, Textbook.id == OrderItem.textbook_id).filter(
+                    Textbook.category_id == category_id
+                )
+            query = query.group_by(OrderItem.textbook_id)
+            key = OrderItem.textbook_id
+        else:
+            units = db.func.sum(cls.units).label('units')
+            query = db.session.query(
+                cls.textbook_id.label('textbook_id'),
+                units,
+                db.func.sum(cls.amount).label('amount')
+            ).filter(cls.day >= start_day)
+            if school_id:
+                query = query.filter(cls.school_id == school_id)
+            if category_id:
+                query = query.filter(cls.category_id == category_id)
+            query = query.group_by(cls.textbook_id)
+            key = cls.textbook_id
+
+        rows = query.having(units > 0).order_by(units.desc(), key).limit(limit).all()
+        return [{
+            'textbook_id': row.textbook_id,
+            'units': int(row.units or 0),
+            'amount': float(row.amount or 0)
+        } for row in rows]
+
+    @classmethod
+    def series(cls, start_day, end_day=None, bucket='day', breakdown=None):
+        """期間バケットごとの冊数・金額（学校・カテゴリ・教科書別）"""
+        if breakdown and breakdown not in cls.BREAKDOWNS:
+            raise ValueError(f'breakdown must be one of {", ".join(cls.BREAKDOWNS)}')
+        period = _bucket_column(bucket, cls.day)
+        group_columns = [period]
+        columns = [period]
+        if breakdown:
+            key = getattr(cls, f'{breakdown}_id')
+            group_columns.append(key)
+            columns.append(key.label('key'))
+        query = db.session.query(
+            *columns,
+            db.func.sum(cls.units).label('units'),
+            db.func.sum(cls.amount).label('sales')
+        ).filter(cls.day >= start_day)
+        if end_day:
+            query = query.filter(cls.day < end_day)
+        rows = query.group_by(*group_columns).order_by(*group_columns).all()
+
+        series = []
+        for row in rows:
+            point = {
+                'period': row.period.isoformat() if row.period else None,
+                'total_sales': float(row.sales or 0),
+                'total_units': int(row.units or 0)
+            }
+            if breakdown:
+                point[f'{breakdown}_id'] = row.key
+            series.append(point)
+        return series
+
+class DailyOrderTotals(BaseModel):
+    """日次注文ロールアップ（学校別の注文数と金額）"""
+    __tablename__ = 'daily_order_totals'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'school_id', name='uq_daily_order_totals_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), nullable=False)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+
+    @classmethod
+    def _apply(cls, condition, sign):
+        from models.order import Order
+        from models.user import User
+        now = datetime.utcnow()
+        day = db.func.date(Order.created_at)
+        select = db.select(
+            day,
+            User.school_id,
+            db.func.count(Order.id) * sign,
+            db.func.sum(Order.total_amount) * sign,
+            db.literal(now, db.DateTime),
+            db.literal(now, db.DateTime)
+        ).select_from(Order).join(
+            User, User.user_id == Order.user_id
+        ).where(condition).group_by(day, User.school_id)
+        _upsert(
+            cls.__table__,
+            ['day', 'school_id', 'orders', 'amount', 'created_at', 'updated_at'],
+            select,
+            'uq_daily_order_totals_key',
+            ('orders', 'amount')
+        )
+
+    @classmethod
+    def totals(cls, start_day, end_day=None):
+        """期間内の売上合計・件数・平均"""
+        query = db.session.query(
+            db.func.coalesce(db.func.sum(cls.amount), 0),
+            db.func.coalesce(db.func.sum(cls.orders), 0)
+        ).filter(cls.day >= start_day)
+        if end_day:
+            query = query.filter(cls.day < end_day)
+        total, count = query.one()
+        return {
+            'total_sales': float(total),
+            'total_orders': int(count),
+            'average_order_value': float(total) / count if count else 0
+        }
+
+    @classmethod
+    def series(cls, start_day, end_day=None, bucket='day', by_school=False):
+        """期間バケットごとの注文数・金額"""
+        period = _bucket_column(bucket, cls.day)
+        group_columns = [period] + ([cls.school_id] if by_school else [])
+        query = db.session.query(
+            *group_columns,
+            db.func.sum(cls.orders).label('orders'),
+            db.func.sum(cls.amount).label('sales')
+        ).filter(cls.day >= start_day)
+        if end_day:
+            query = query.filter(cls.day < end_day)
+        rows = query.group_by(*group_columns).order_by(*group_columns).all()
+
+        series = []
+        for row in rows:
+            point = {
+                'period': row.period.isoformat() if row.period else None,
+                'total_sales': float(row.sales or 0),
+                'total_orders': int(row.orders or 0),
+                'average_order_value': float(row.sales or 0) / row.orders if row.orders else 0
+            }
+            if by_school:
+                point['school_id'] = row.school_id
+            series.append(point)
+        return series
@@ -1,5 +1,6 @@
-from . import db, BaseModel
-from werkzeug.security import generate_password_hash, check_password_hash
+from extensions import db
+from models.base_model import BaseModel, _finish
+from utils.passwords import hash_password, verify_password, needs_rehash
 from sqlalchemy.orm import validates
 
 class SchoolAuth(BaseModel):
@@ -16,10 +17,16 @@ class SchoolAuth(BaseModel):
     school = db.relationship('School', backref=db.backref('auths', lazy=True))
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        self.password_hash = hash_password(password)
+
+    def check_password(self, password, commit=True):
+        if not verify_password(self.password_hash, password):
+            return False
+        # コスト設定が変わっていればログイン成功時に再ハッシュ
+        if needs_rehash(self.password_hash):
+            self.set_password(password)
+            _finish(commit)
+        return True
 
     @validates('email')
     def validate_email(self, key, email):
@@ -1,5 +1,6 @@
-from . import db, BaseModel
-from werkzeug.security import generate_password_hash, check_password_hash
+from extensions import db
+from models.base_model import BaseModel, _finish
+from utils.passwords import hash_password, verify_password, needs_rehash
 from sqlalchemy.orm import validates
 
 class SchoolAuth(BaseModel):
@@ -31,11 +32,16 @@ class SchoolAuth(BaseModel):
         """パスワードをハッシュ化して設定"""
         if len(password) < 6:
             raise ValueError('Password must be at least 6 characters long')
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
-    def check_password(self, password):
-        """パスワードの検証"""
-        return check_password_hash(self.password_hash, password)
+    def check_password(self, password, commit=True):
+        """パスワードの検証（コスト設定が変わっていれば再ハッシュ）"""
+        if not verify_password(self.password_hash, password):
+            return False
+        if needs_rehash(self.password_hash):
+            self.set_password(password)
+            _finish(commit)
+        return True
     
     def to_dict(self):
         """辞書形式に変換"""
@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta
+from extensions import db
+from models.base_model import BaseModel, _finish
+
+class StockMovement(BaseModel):
+    """在庫変動台帳（追記専用）"""
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        db.Index('ix_stock_movements_textbook_created', 'textbook_id', 'created_at'),
+        db.Index('ix_stock_movements_created', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    textbook_id = db.Column(db.Integer, db.ForeignKey('textbooks.id'), nullable=False)
+    change = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(20), nullable=False)  # order / cancel / adjust
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'))
+    note = db.Column(db.String(255))
+
+    REASONS = ('order', 'cancel', 'adjust')
+
+    @classmethod
+    def build(cls, textbook_id, change, reason, order_id=None, note=None, created_at=None):
+        """bulk_insert_mappings 用の行データを生成"""
+        if reason not in cls.REASONS:
+            raise ValueError(f'Invalid stock movement reason: {reason}')
+        now = created_at or datetime.utcnow()
+        return {
+            'textbook_id': textbook_id,
+            'change': change,
+            'reason': reason,
+            'order_id': order_id,
+            'note': note,
+            'created_at': now,
+            'updated_at': now
+        }
+
+    @classmethod
+    def record_many(cls, movements):
+        """変動をまとめて追記（コミットは呼び出し側のトランザクションで行う）"""
+        movements = [m for m in movements if m['change']]
+        if movements:
+            db.session.bulk_insert_mappings(cls, movements)
+        return len(movements)
+
+    @classmethod
+    def record_for_orders(cls, order_ids, reason, note=None):
+        """注文明細から変動を INSERT ... SELECT で一括追記"""
+        from models.order import OrderItem
+        now = datetime.utcnow()
+        sign = 1 if reason == 'cancel' else -1
+        select = db.select(
+            OrderItem.textbook_id,
+            OrderItem.quantity * sign,
+            db.literal(reason),
+            OrderItem.order_id,
+            db.literal(note, db.String),
+            db.literal(now, db.DateTime),
+            db.literal(now, db.DateTime)
+        ).where(OrderItem.order_id.in_(order_ids))
+        db.session.execute(cls.__table__.insert().from_select(
+            ['textbook_id', 'change', 'reason', 'order_id', 'note', 'created_at', 'updated_at'],
+            select
+        ))
+
+    @classmethod
+    def history(cls, textbook_id, start=None, end=None, limit=100, before_id=None):
+        """教科書ごとの変動履歴（新しい順、インデックス範囲読み）"""
+        query = cls.query.filter(cls.textbook_id == textbook_id)
+        if start:
+            query = query.filter(cls.created_at >= start)
+        if end:
+            query = query.filter(cls.created_at < end)
+        if before_id:
+            query = query.filter(cls.id < before_id)
+        return query.order_by(cls.created_at.desc(), cls.id.desc()).limit(limit).all()
+
+    @classmethod
+    def stock_at(cls, textbook_id, at):
+        """指定時刻の在庫数（直近スナップショット＋以降の変動の合計）。圧縮で履歴が消えた時刻は ValueError"""
+        # compact はスナップショット以前の変動をまとめて削除する。at の次のスナップショットまでに
+        # 変動が1件も残っていなければ、at 以降の変動が削除されている可能性がある
+        following = StockSnapshot.earliest_after(textbook_id, at)
+        if following is not None and not db.session.query(cls.query.filter(
+            cls.textbook_id == textbook_id,
+            cls.created_at <= following.snapshot_at
+        ).exists()).scalar():
+            raise ValueError(f'Stock history before {following.snapshot_at.isoformat()} is no longer retained')
+
+        snapshot = StockSnapshot.latest_before(textbook_id, at)
+        if snapshot:
+            delta = db.session.query(db.func.coalesce(db.func.sum(cls.change), 0)).filter(
+                cls.textbook_id == textbook_id,
+                cls.created_at > snapshot.snapshot_at,
+                cls.created_at <= at
+            ).scalar()
+            return snapshot.stock_quantity + int(delta or 0)
+
+        # スナップショットがなければ現在庫から以降の変動を差し引く
+        from models.textbook import Textbook
+        current = db.session.query(Textbook.stock_quantity).filter(Textbook.id == textbook_id).scalar()
+        if current is None:
+            return None
+        delta = db.session.query(db.func.coalesce(db.func.sum(cls.change), 0)).filter(
+            cls.textbook_id == textbook_id,
+            cls.created_at > at
+        ).scalar()
+        return current - int(delta or 0)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'textbook_id': self.textbook_id,
+            'change': self.change,
+            'reason': self.reason,
+            'order_id': self.order_id,
+            'note': self.note,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class StockSnapshot(BaseModel):
+    """在庫スナップショット（台帳の圧縮用）"""
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('textbook_id', 'snapshot_at', name='uq_stock_snapshots_textbook_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    textbook_id = db.Column(db.Integer, db.ForeignKey('textbooks.id'), nullable=False)
+    snapshot_at = db.Column(db.DateTime, nullable=False)
+    stock_quantity = db.Column(db.Integer, nullable=False)
+
+    @classmethod
+    def latest_before(cls, textbook_id, at):
+        """指定時刻以前の最新スナップショット"""
+        return cls.query.filter(
+            cls.textbook_id == textbook_id,
+            cls.snapshot_at <= at
+        ).order_by(cls.snapshot_at.desc()).first()
+
+    @classmethod
+    def earliest_after(cls, textbook_id, at):
+        """指定時刻より後の最古のスナップショット"""
+        return cls.query.filter(
+            cls.textbook_id == textbook_id,
+            cls.snapshot_at > at
+        ).order_by(cls.snapshot_at).first()
+
+    @classmethod
+    def compact(cls, as_of=None, retention_days=None, commit=True):
+        """変動のあった教科書のスナップショットを作成し、保持期間を過ぎた変動を削除"""
+        from models.textbook import Textbook
+        as_of = as_of or datetime.utcnow()
+
+        latest = db.session.query(
+            cls.textbook_id,
+            db.func.max(cls.snapshot_at).label('snapshot_at')
+        ).group_by(cls.textbook_id).subquery()
+
+        # 前回スナップショット以降に変動があった、または未スナップショットの教科書
+        changed = db.session.query(StockMovement.textbook_id).outerjoin(
+            latest, StockMovement.textbook_id == latest.c.textbook_id
+        ).filter(
+            StockMovement.created_at <= as_of,
+            db.or_(latest.c.snapshot_at.is_(None), StockMovement.created_at > latest.c.snapshot_at)
+        ).distinct()
+        unsnapshotted = db.session.query(Textbook.id).outerjoin(
+            latest, Textbook.id == latest.c.textbook_id
+        ).filter(latest.c.textbook_id.is_(None))
+
+        # as_of 時点の在庫 = 現在庫 - as_of 以降の変動合計（GROUP BY 1回）
+        after = db.session.query(
+            StockMovement.textbook_id,
+            db.func.sum(StockMovement.change).label('delta')
+        ).filter(StockMovement.created_at > as_of).group_by(StockMovement.textbook_id).subquery()
+        rows = db.session.query(
+            Textbook.id,
+            (Textbook.stock_quantity - db.func.coalesce(after.c.delta, 0)).label('quantity')
+        ).outerjoin(after, Textbook.id == after.c.textbook_id).filter(
+            db.or_(Textbook.id.in_(changed), Textbook.id.in_(unsnapshotted))
+        ).all()
+
+        mappings = [{
+            'textbook_id': row.id,
+            'snapshot_at': as_of,
+            'stock_quantity': int(row.quantity or 0),
+            'created_at': as_of,
+            'updated_at': as_of
+        } for row in rows]
+        if mappings:
+            db.session.bulk_insert_mappings(cls, mappings)
+            db.session.flush()
+
+        pruned = 0
+        if retention_days is not None:
+            # 保持期限以前の最新スナップショットで覆われた変動のみ削除
+            cutoff = as_of - timedelta(days=retention_days)
+            boundary = db.session.query(db.func.max(cls.snapshot_at)).filter(
+                cls.textbook_id == StockMovement.textbook_id,
+                cls.snapshot_at <= cutoff
+            ).correlate(StockMovement).scalar_subquery()
+            pruned = StockMovement.query.filter(
+                StockMovement.created_at <= boundary
+            ).delete(synchronize_session=False)
+
+        _finish(commit)
+        return {'snapshots': len(mappings), 'pruned_movements': pruned}
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'textbook_id': self.textbook_id,
+            'snapshot_at': self.snapshot_at.isoformat() if self.snapshot_at else None,
+            'stock_quantity': self.stock_quantity
+        }
@@ -3,6 +3,16 @@ from models.base_model import BaseModel
 
 class Textbook(BaseModel):
     __tablename__ = 'textbooks'
+    __table_args__ = (
+        # 在庫僅少の教科書だけを対象にした部分インデックス（在庫レポート用）
+        db.Index(
+            'ix_textbooks_low_stock', 'stock_quantity', 'id',
+            postgresql_where=db.text('stock_quantity <= 10')
+        ),
+        db.Index('ix_textbooks_school_category', 'school_id', 'category_id'),
+    )
+    
+    LOW_STOCK_THRESHOLD = 10
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -19,6 +29,76 @@ class Textbook(BaseModel):
     category = db.relationship('Category', back_populates='textbooks')
     school = db.relationship('School', back_populates='textbooks')
     
+    @classmethod
+    def decrement_stock(cls, quantities):
+        """{教科書ID: 冊数} を在庫が足りる行だけ1文の UPDATE で減らし、在庫不足の教科書IDを返す"""
+        ids = sorted(quantities)
+        # 読んでから書くと同時注文で在庫を取り合うので、ID 順に行ロックを取ってから条件付きで減算
+        db.session.execute(db.select(cls.id).where(cls.id.in_(ids)).order_by(cls.id).with_for_update())
+        wanted = db.values(
+            db.column('textbook_id', db.Integer), db.column('quantity', db.Integer), name='wanted'
+        ).data([(textbook_id, quantities[textbook_id]) for textbook_id in ids])
+        result = db.session.execute(
+            db.update(cls)
+            .where(cls.id == wanted.c.textbook_id, cls.stock_quantity >= wanted.c.quantity)
+            .values(stock_quantity=cls.stock_quantity - wanted.c.quantity)
+            .returning(cls.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated = {row.id for row in result}
+        return [textbook_id for textbook_id in ids if textbook_id not in updated]
+    
+    @classmethod
+    def low_stock_query(cls, threshold=None):
+        """在庫僅少の教科書（在庫の少ない順）"""
+        if threshold is None:
+            threshold = cls.LOW_STOCK_THRESHOLD
+        return cls.query.filter(cls.stock_quantity <= threshold).order_by(cls.stock_quantity, cls.id)
+    
+    @classmethod
+    def get_low_stock_textbooks(cls, threshold=None, limit=5):
+        """在庫僅少の教科書上位 N 件（在庫切れを除く）"""
+        return cls.low_stock_query(threshold).filter(cls.stock_quantity > 0).limit(limit).all()
+    
+    @classmethod
+    def get_out_of_stock_textbooks(cls, limit=5):
+        """在庫切れの教科書上位 N 件"""
+        return cls.low_stock_query(0).limit(limit).all()
+    
+    @classmethod
+    def stock_alert_counts(cls, threshold=None):
+        """在庫僅少（在庫切れを除く）・在庫切れの件数（他の集計と同じ SELECT に埋め込むスカラーサブクエリ）"""
+        if threshold is None:
+            threshold = cls.LOW_STOCK_THRESHOLD
+        count_all = db.func.count()
+        return (
+            db.session.query(count_all.filter(cls.stock_quantity > 0)).select_from(cls).filter(
+                cls.stock_quantity <= threshold
+            ).scalar_subquery().label('low_stock_count'),
+            db.session.query(count_all).select_from(cls).filter(
+                cls.stock_quantity <= 0
+            ).scalar_subquery().label('out_of_stock_count')
+        )
+    
+    @classmethod
+    def inventory_valuation(cls, group_by='category'):
+        """在庫評価額（在庫数×価格）をカテゴリまたは学校ごとに集計"""
+        if group_by not in ('category', 'school'):
+            raise ValueError('group_by must be category or school')
+        key = cls.category_id if group_by == 'category' else cls.school_id
+        rows = db.session.query(
+            key.label('key'),
+            db.func.count(cls.id).label('titles'),
+            db.func.coalesce(db.func.sum(cls.stock_quantity), 0).label('units'),
+            db.func.coalesce(db.func.sum(cls.stock_quantity * cls.price), 0).label('value')
+        ).group_by(key).order_by(key).all()
+        return [{
+            f'{group_by}_id': row.key,
+            'titles': row.titles,
+            'units': int(row.units),
+            'value': float(row.value)
+        } for row in rows]
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -1,9 +1,19 @@
+from datetime import datetime
 from extensions import db
-from models.base_model import BaseModel
-from werkzeug.security import generate_password_hash, check_password_hash
+from models.base_model import BaseModel, _finish
+from utils.passwords import hash_password, verify_password, needs_rehash
 
 class User(BaseModel):
     __tablename__ = 'users'
+    __table_args__ = (
+        # 生徒名簿の絞り込み（学校・ロール・学年・クラス）とキーセットページング用
+        db.Index('ix_users_roster', 'school_id', 'role', 'grade', 'class_name', 'user_id'),
+        # 前方一致検索（LIKE 'abc%'）用
+        db.Index('ix_users_last_name_prefix', 'last_name', postgresql_ops={'last_name': 'varchar_pattern_ops'}),
+        db.Index('ix_users_first_name_prefix', 'first_name', postgresql_ops={'first_name': 'varchar_pattern_ops'}),
+        db.Index('ix_users_student_id_prefix', 'student_id', postgresql_ops={'student_id': 'varchar_pattern_ops'}),
+        db.Index('ix_users_email_prefix', 'email', postgresql_ops={'email': 'varchar_pattern_ops'}),
+    )
     
     user_id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -22,10 +32,135 @@ class User(BaseModel):
     school = db.relationship('School', back_populates='users')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+    def check_password(self, password, commit=True):
+        if not verify_password(self.password_hash, password):
+            return False
+        # コスト設定が変わっていればログイン成功時に再ハッシュ
+        if needs_rehash(self.password_hash):
+            self.set_password(password)
+            _finish(commit)
+        return True
+    
+    @property
+    def full_name(self):
+        return f'{self.last_name} {self.first_name}'
+    
+    @property
+    def is_student(self):
+        return self.role == 'student'
+    
+    @classmethod
+    def search(cls, school_id=None, role=None, grade=None, class_name=None, keyword=None):
+        """ユーザー検索（keyword は氏名・学籍番号・メールアドレスの前方一致）"""
+        query = cls.query
+        if school_id:
+            query = query.filter(cls.school_id == school_id)
+        if role:
+            query = query.filter(cls.role == role)
+        if grade:
+            query = query.filter(cls.grade == grade)
+        if class_name:
+            query = query.filter(cls.class_name == class_name)
+        if keyword:
+            pattern = keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            query = query.filter(db.or_(
+                cls.last_name.like(pattern, escape='\\'),
+                cls.first_name.like(pattern, escape='\\'),
+                cls.student_id.like(pattern, escape='\\'),
+                cls.email.like(pattern, escape='\\')
+            ))
+        return query
+    
+    @classmethod
+    def keyset_page(cls, query, after_id=None, limit=50):
+        """user_id 順のキーセットページング（OFFSET を使わない）"""
+        if after_id:
+            query = query.filter(cls.user_id > after_id)
+        rows = query.order_by(cls.user_id).limit(limit + 1).all()
+        next_cursor = rows[limit - 1].user_id if len(rows) > limit else None
+        return rows[:limit], next_cursor
+    
+    ROSTER_REQUIRED_FIELDS = ('username', 'email', 'password', 'first_name', 'last_name')
+    ROSTER_OPTIONAL_FIELDS = ('student_id', 'grade', 'class_name')
+    
+    @classmethod
+    def import_roster(cls, school_id, rows, chunk_size=1000, progress=None, commit=True):
+        """生徒名簿を一括登録（重複チェックはキーごとに IN 1回、ハッシュは並列、INSERT は複数行）"""
+        from utils.passwords import hash_many
+        errors = []
+        valid = []
+        seen_usernames = set()
+        seen_emails = set()
+        
+        for line, row in rows:
+            missing = [field for field in cls.ROSTER_REQUIRED_FIELDS if not (row.get(field) or '').strip()]
+            if missing:
+                errors.append({'line': line, 'error': f'Missing {", ".join(missing)}'})
+                continue
+            username = row['username'].strip()
+            email = row['email'].strip()
+            if '@' not in email:
+                errors.append({'line': line, 'error': 'Invalid email'})
+                continue
+            if username in seen_usernames or email in seen_emails:
+                errors.append({'line': line, 'error': 'Duplicate username or email in file'})
+                continue
+            seen_usernames.add(username)
+            seen_emails.add(email)
+            valid.append((line, row, username, email))
+        
+        existing_usernames = set()
+        existing_emails = set()
+        for i in range(0, len(valid), chunk_size):
+            chunk = valid[i:i + chunk_size]
+            existing_usernames.update(name for (name,) in db.session.query(cls.username).filter(
+                cls.username.in_([username for _, _, username, _ in chunk])
+            ))
+            existing_emails.update(email for (email,) in db.session.query(cls.email).filter(
+                cls.email.in_([email for _, _, _, email in chunk])
+            ))
+        
+        accepted = []
+        for line, row, username, email in valid:
+            if username in existing_usernames:
+                errors.append({'line': line, 'error': 'Username already exists'})
+            elif email in existing_emails:
+                errors.append({'line': line, 'error': 'Email already exists'})
+            else:
+                accepted.append((row, username, email))
+        
+        hashes = hash_many(row['password'] for row, _, _ in accepted)
+        now = datetime.utcnow()
+        mappings = [{
+            'username': username,
+            'email': email,
+            'password_hash': password_hash,
+            'first_name': row['first_name'].strip(),
+            'last_name': row['last_name'].strip(),
+            'role': 'student',
+            'school_id': school_id,
+            'student_id': (row.get('student_id') or '').strip() or None,
+            'grade': (row.get('grade') or '').strip() or None,
+            'class_name': (row.get('class_name') or '').strip() or None,
+            'is_active': True,
+            'created_at': now,
+            'updated_at': now
+        } for (row, username, email), password_hash in zip(accepted, hashes)]
+        
+        # executemany は psycopg2 では複数行 VALUES にまとめて送信される
+        for i in range(0, len(mappings), chunk_size):
+            db.session.execute(cls.__table__.insert(), mappings[i:i + chunk_size])
+            if progress:
+                progress(min(i + chunk_size, len(mappings)), len(mappings))
+        _finish(commit)
+        
+        return {
+            'imported': len(mappings),
+            'failed': len(errors),
+            'errors': sorted(errors, key=lambda error: error['line'])
+        }
     
     @classmethod
     def find_by_email(cls, email):
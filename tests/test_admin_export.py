@@ -0,0 +1,55 @@
+import io
+import time
+
+from openpyxl import load_workbook
+
+from models.order import Order, OrderItem
+
+
+def make_order_line(factory):
+    student = factory.user()
+    textbook = factory.textbook(title='Export Book')
+    order = Order(user_id=student.user_id, total_amount=2000, status='pending').save()
+    OrderItem(order_id=order.id, textbook_id=textbook.id, quantity=2, unit_price=1000, total_price=2000).save()
+    return order.id
+
+
+def test_csv_export_streams_rows(client, factory):
+    admin = factory.user(role='admin')
+    order_id = make_order_line(factory)
+
+    response = client.get('/api/v1/admin/orders/export', headers=factory.auth_header(admin))
+
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).lstrip('\ufeff').splitlines()
+    assert lines[0].split(',') == list(Order.EXPORT_COLUMNS)
+    assert len(lines) == 2
+    assert lines[1].startswith(f'{order_id},')
+
+
+def test_xlsx_export_runs_as_a_job(client, factory):
+    admin = factory.user(role='admin')
+    make_order_line(factory)
+    headers = factory.auth_header(admin)
+
+    response = client.get('/api/v1/admin/orders/export?format=xlsx', headers=headers)
+    assert response.status_code in (200, 202)
+    download_url = response.get_json()['download_url']
+
+    deadline = time.monotonic() + 10
+    download = client.get(download_url, headers=headers)
+    while download.status_code == 202 and time.monotonic() < deadline:
+        time.sleep(0.05)
+        download = client.get(download_url, headers=headers)
+
+    assert download.status_code == 200
+    sheet = load_workbook(io.BytesIO(download.data), read_only=True)['orders']
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[0] == Order.EXPORT_COLUMNS
+    assert rows[1][Order.EXPORT_COLUMNS.index('title')] == 'Export Book'
+
+
+def test_export_requires_admin(client, factory):
+    student = factory.user()
+    response = client.get('/api/v1/admin/orders/export', headers=factory.auth_header(student))
+    assert response.status_code == 403
@@ -0,0 +1,82 @@
+from models.order import Order
+from utils.cache import cache
+
+
+def make_order(factory, user, status='pending'):
+    return Order(user_id=user.user_id, total_amount=1000, status=status).save()
+
+
+def test_bulk_status_update_requires_admin(client, factory):
+    student = factory.user()
+    response = client.post('/api/v1/admin/orders/status', json={'status': 'confirmed', 'order_ids': [1]},
+                           headers=factory.auth_header(student))
+    assert response.status_code == 403
+
+
+def test_bulk_status_update_reports_each_order(client, factory):
+    admin = factory.user(role='admin')
+    student = factory.user()
+    pending = make_order(factory, student)
+    shipped = make_order(factory, student, status='shipped')
+    pending_id, shipped_id = pending.id, shipped.id
+
+    response = client.post('/api/v1/admin/orders/status', json={
+        'status': 'confirmed', 'order_ids': [pending_id, shipped_id, 999999]
+    }, headers=factory.auth_header(admin))
+
+    assert response.status_code == 200
+    results = {row['order_id']: row['result'] for row in response.get_json()['results']}
+    assert results[pending_id] == 'updated'
+    assert results[shipped_id] == 'invalid_transition_from_shipped'
+    assert results[999999] == 'not_found'
+    assert Order.query.get(pending_id).status == 'confirmed'
+
+
+def test_admin_bulk_cancel_restocks(client, factory):
+    from models.order import OrderItem
+    from models.textbook import Textbook
+    admin = factory.user(role='admin')
+    student = factory.user()
+    textbook = factory.textbook(stock_quantity=5)
+    order = make_order(factory, student)
+    OrderItem(order_id=order.id, textbook_id=textbook.id, quantity=2, unit_price=1000, total_price=2000).save()
+    order_id, textbook_id = order.id, textbook.id
+
+    response = client.post('/api/v1/admin/orders/cancel', json={'order_ids': [order_id], 'reason': 'test'},
+                           headers=factory.auth_header(admin))
+
+    assert response.status_code == 200
+    assert response.get_json()['cancelled_count'] == 1
+    assert Textbook.query.get(textbook_id).stock_quantity == 7
+
+
+def test_user_bulk_cancel_only_touches_own_orders(client, factory):
+    owner = factory.user()
+    other = factory.user()
+    own = make_order(factory, owner)
+    foreign = make_order(factory, other)
+    own_id, foreign_id = own.id, foreign.id
+
+    response = client.post('/api/v1/orders/cancel', json={'order_ids': [own_id, foreign_id]},
+                           headers=factory.auth_header(owner))
+
+    assert response.status_code == 200
+    results = {row['order_id']: row['result'] for row in response.get_json()['results']}
+    assert results == {own_id: 'cancelled', foreign_id: 'not_found'}
+    assert Order.query.get(foreign_id).status == 'pending'
+
+
+def test_dashboard_payload_includes_recent_orders_and_is_cached(client, factory):
+    headers = factory.auth_header(factory.user(role='admin'))
+    buyer = factory.user()
+    order_ids = [make_order(factory, buyer).id for _ in range(2)]
+    cache.invalidate('admin_dashboard')
+
+    first = client.get('/api/v1/admin/dashboard', headers=headers).get_json()
+    assert [order['id'] for order in first['recent_orders']] == order_ids[::-1]
+    assert first['stats']['total_orders'] == 2
+
+    make_order(factory, buyer)
+    second = client.get('/api/v1/admin/dashboard', headers=headers).get_json()
+    assert second == first
+    cache.invalidate('admin_dashboard')
@@ -0,0 +1,49 @@
+def test_students_page_by_cursor(client, factory):
+    headers = factory.auth_header(factory.user(role='admin'))
+    school = factory.school()
+    ids = [factory.user(school=school).user_id for _ in range(3)]
+
+    first = client.get('/api/v1/admin/students', query_string={'school_id': school.id, 'per_page': 2},
+                       headers=headers).get_json()
+    assert [s['user_id'] for s in first['students']] == ids[:2]
+    assert first['next_cursor'] == ids[1]
+
+    second = client.get('/api/v1/admin/students',
+                        query_string={'school_id': school.id, 'per_page': 2, 'cursor': first['next_cursor']},
+                        headers=headers).get_json()
+    assert [s['user_id'] for s in second['students']] == ids[2:]
+    assert second['next_cursor'] is None
+    assert second['students'][0]['school_name'] == school.school_name
+
+
+def test_students_requires_admin(client, factory):
+    response = client.get('/api/v1/admin/students', headers=factory.auth_header(factory.user()))
+    assert response.status_code == 403
+
+
+def test_import_roster_csv(client, factory):
+    headers = factory.auth_header(factory.user(role='admin'))
+    school = factory.school()
+    existing = factory.user(school=school)
+    body = ('username,email,password,first_name,last_name,grade\n'
+            'hanako,hanako@example.com,secret123,Hanako,Sato,2\n'
+            f'{existing.username},dup@example.com,secret123,Jiro,Suzuki,2\n'
+            'noemail,,secret123,Saburo,Tanaka,2\n').encode('utf-8')
+
+    response = client.post('/api/v1/admin/students/import', query_string={'school_id': school.id},
+                           data=body, content_type='text/csv', headers=headers)
+    assert response.status_code == 201
+    result = response.get_json()
+    assert (result['imported'], result['failed']) == (1, 2)
+    assert [error['line'] for error in result['errors']] == [3, 4]
+
+    listing = client.get('/api/v1/admin/students', query_string={'q': 'Sato'}, headers=headers).get_json()
+    assert [s['grade'] for s in listing['students']] == ['2']
+
+
+def test_import_roster_rejects_missing_columns(client, factory):
+    headers = factory.auth_header(factory.user(role='admin'))
+    school = factory.school()
+    response = client.post('/api/v1/admin/students/import', query_string={'school_id': school.id},
+                           data=b'username,email\n', content_type='text/csv', headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,29 @@
+from utils.analytics import create_snapshot
+
+
+def test_aggregate_reads_the_current_snapshot(app, client, factory):
+    admin = factory.user(role='admin')
+    headers = factory.auth_header(admin)
+    book = factory.textbook(stock_quantity=5)
+    factory.textbook(school=book.school, category=book.category, stock_quantity=7)
+
+    with app.app_context():
+        meta = create_snapshot(app.config['ANALYTICS_DATA_DIR'])
+
+    response = client.get('/api/v1/admin/analytics/snapshot', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['snapshot']['snapshot_id'] == meta['snapshot_id']
+
+    response = client.get('/api/v1/admin/analytics/aggregate',
+                          query_string={'table': 'textbooks', 'metric': 'stock_quantity'}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['rows'] == [{'value': 12.0, 'rows': 2}]
+
+
+def test_aggregate_rejects_unknown_metric(app, client, factory):
+    headers = factory.auth_header(factory.user(role='admin'))
+    with app.app_context():
+        create_snapshot(app.config['ANALYTICS_DATA_DIR'])
+    response = client.get('/api/v1/admin/analytics/aggregate',
+                          query_string={'table': 'orders', 'metric': 'nope'}, headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,92 @@
+import threading
+import time
+import types
+
+import pytest
+
+from utils import cache as cache_module
+from utils.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """utils.cache から見える time.monotonic を手で進める"""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(cache_module, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def counter():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+    return compute, calls
+
+
+def test_value_is_recomputed_after_ttl(clock):
+    cache = TTLCache()
+    compute, calls = counter()
+
+    assert cache.get_or_compute('k', compute, ttl=10) == 1
+    clock.now += 9
+    assert cache.get_or_compute('k', compute, ttl=10) == 1
+    clock.now += 2
+    assert cache.get_or_compute('k', compute, ttl=10) == 2
+    assert len(calls) == 2
+
+
+def test_stale_value_is_served_while_refreshing(app, clock):
+    cache = TTLCache()
+    release = threading.Event()
+    values = iter(['old', 'new'])
+
+    def compute():
+        value = next(values)
+        if value == 'new':
+            release.wait(5)
+        return value
+
+    assert cache.get_or_compute('k', compute, ttl=10, stale_ttl=60) == 'old'
+    clock.now += 11
+    with app.app_context():
+        # 再計算が終わるまでは古い値を返し、再計算は1本だけ走る
+        assert cache.get_or_compute('k', compute, ttl=10, stale_ttl=60) == 'old'
+        assert cache.get_or_compute('k', compute, ttl=10, stale_ttl=60) == 'old'
+    release.set()
+    deadline = time.monotonic() + 5
+    while 'k' in cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get_or_compute('k', compute, ttl=10, stale_ttl=60) == 'new'
+
+
+def test_value_past_stale_window_is_recomputed_inline(clock):
+    cache = TTLCache()
+    compute, calls = counter()
+
+    cache.get_or_compute('k', compute, ttl=10, stale_ttl=5)
+    clock.now += 16
+    assert cache.get_or_compute('k', compute, ttl=10, stale_ttl=5) == 2
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(max_entries=2)
+    cache.get_or_compute('a', lambda: 'a', ttl=60)
+    cache.get_or_compute('b', lambda: 'b', ttl=60)
+    cache.get_or_compute('a', lambda: 'unused', ttl=60)
+    cache.get_or_compute('c', lambda: 'c', ttl=60)
+
+    assert list(cache._entries) == ['a', 'c']
+
+
+def test_entries_past_stale_window_are_dropped_before_lru(clock):
+    cache = TTLCache(max_entries=2)
+    cache.get_or_compute('a', lambda: 'a', ttl=60)
+    cache.get_or_compute('b', lambda: 'b', ttl=1)
+    clock.now += 2
+    cache._lookup('b')
+    cache.get_or_compute('c', lambda: 'c', ttl=60)
+
+    # LRU だけなら 'a' が追い出されるが、猶予も過ぎた 'b' が先に捨てられる
+    assert list(cache._entries) == ['a', 'c']
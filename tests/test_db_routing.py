@@ -0,0 +1,13 @@
+import warnings
+
+from app import create_app
+
+
+def test_create_app_again_leaves_registered_blueprints_alone(app):
+    # レプリカ振り分けのフックはアプリ側に付くので、2つ目のアプリでもブループリントを変更しない
+    with warnings.catch_warnings():
+        warnings.filterwarnings('error', message='The setup method', category=UserWarning)
+        second = create_app('testing')
+    assert [f.__name__ for f in second.before_request_funcs[None]].count('use_replica_for_reads') == 1
+    assert all('use_replica_for_reads' not in [f.__name__ for f in funcs]
+               for name, funcs in second.before_request_funcs.items() if name is not None)
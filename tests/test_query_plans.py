@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from extensions import db
+from models.cart import Cart
+from models.order import Order, OrderItem
+from models.textbook import Textbook
+
+
+def explain(query):
+    """シーケンシャルスキャンを禁止した状態の実行計画（空のテーブルでもインデックスを選ばせる）"""
+    sql = query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+    db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+    return '\n'.join(db.session.execute(db.text(f'EXPLAIN {sql}')).scalars())
+
+
+@pytest.mark.parametrize('build_query, index_name', [
+    (lambda: Cart.query.filter_by(user_id=1, textbook_id=1), 'uq_carts_user_textbook'),
+    (lambda: Cart.query.filter_by(user_id=1), 'uq_carts_user_textbook'),
+    (
+        lambda: Order.query.filter(Order.user_id == 1, Order.status == 'pending').order_by(Order.created_at.desc()),
+        'ix_orders_user_status_created'
+    ),
+    (lambda: OrderItem.query.filter(OrderItem.order_id == 1), 'ix_order_items_order_id'),
+    (lambda: OrderItem.query.filter(OrderItem.textbook_id == 1), 'ix_order_items_textbook_id'),
+    (
+        lambda: Textbook.query.filter(Textbook.school_id == 1, Textbook.category_id == 1),
+        'ix_textbooks_school_category'
+    ),
+])
+def test_hot_path_queries_use_their_index(session, build_query, index_name):
+    assert index_name in explain(build_query())
@@ -0,0 +1,73 @@
+import pytest
+
+from utils import passwords
+from utils.rate_limit import TokenBucketLimiter
+
+
+@pytest.fixture
+def hash_calls(monkeypatch):
+    """パスワードのハッシュ・照合はすべて _run を通るので、呼び出しを記録して本物は動かさない"""
+    calls = []
+
+    def fake_run(fn, *args):
+        calls.append(fn.__name__)
+        return False
+
+    monkeypatch.setattr(passwords, '_run', fake_run)
+    monkeypatch.setattr(passwords, '_dummy_hash', 'dummy')
+    return calls
+
+
+def test_bucket_is_exhausted_then_refills(tmp_path, monkeypatch):
+    limiter = TokenBucketLimiter()
+    path = str(tmp_path / 'buckets.sqlite3')
+    now = [1000.0]
+    monkeypatch.setattr('utils.rate_limit.time.time', lambda: now[0])
+
+    limits = [('id:a', 2, 1 / 60)]
+    assert limiter.consume(path, limits) == 0
+    assert limiter.consume(path, limits) == 0
+    assert limiter.consume(path, limits) == 60
+    now[0] += 60
+    assert limiter.consume(path, limits) == 0
+
+
+def test_rejected_attempt_consumes_no_bucket(tmp_path):
+    limiter = TokenBucketLimiter()
+    path = str(tmp_path / 'buckets.sqlite3')
+    limiter.consume(path, [('id:a', 1, 1 / 60)])
+
+    # id:a が空なので ip:x からも取らない
+    assert limiter.consume(path, [('ip:x', 1, 1 / 60), ('id:a', 1, 1 / 60)]) > 0
+    assert limiter.consume(path, [('ip:x', 1, 1 / 60)]) == 0
+
+
+def test_login_is_limited_before_password_check(client, factory, hash_calls):
+    user = factory.user()
+    burst = client.application.config['LOGIN_RATE_LIMIT_ID_BURST']
+    attempt = {'email': user.email, 'password': 'wrong-password'}
+    environ = {'REMOTE_ADDR': '203.0.113.45'}
+
+    for _ in range(burst):
+        assert client.post('/api/v1/auth/login', json=attempt, environ_base=environ).status_code == 401
+    assert len(hash_calls) == burst
+
+    response = client.post('/api/v1/auth/login', json=attempt, environ_base=environ)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    # 制限された試行ではパスワード照合まで進まない
+    assert len(hash_calls) == burst
+
+
+def test_unknown_accounts_share_the_id_limit(client, hash_calls):
+    burst = client.application.config['LOGIN_RATE_LIMIT_ID_BURST']
+    attempt = {'email': 'Nobody@Example.com', 'password': 'x'}
+    environ = {'REMOTE_ADDR': '203.0.113.46'}
+
+    statuses = [client.post('/api/v1/auth/login', json=attempt, environ_base=environ).status_code
+                for _ in range(burst + 1)]
+    # 大文字小文字違いも同じ ID として数える
+    statuses.append(client.post('/api/v1/auth/login', json={**attempt, 'email': 'nobody@example.com'},
+                                environ_base=environ).status_code)
+    assert statuses == [401] * burst + [429, 429]
+    assert len(hash_calls) == burst
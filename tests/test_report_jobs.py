@@ -0,0 +1,71 @@
+import time
+from datetime import datetime, timedelta
+
+from models.sales_rollup import DailySales
+from utils.report_jobs import ReportJobManager
+
+
+def test_relative_window_is_resolved_before_hashing():
+    spec = ReportJobManager.normalize_spec({'type': 'sales', 'params': {'days': 30}})
+    assert spec['params']['start_day'] == (datetime.utcnow() - timedelta(days=30)).date().isoformat()
+
+    default = ReportJobManager.normalize_spec({'type': 'sales'})
+    assert default['params']['days'] == 365
+    assert 'start_day' in default['params']
+
+
+def test_explicit_start_day_is_kept():
+    spec = ReportJobManager.normalize_spec({'type': 'sales', 'params': {'start_day': '2026-04-01'}})
+    assert spec['params'] == {'start_day': '2026-04-01'}
+
+
+def test_sales_report_job_round_trip(client, factory):
+    admin = factory.user(role='admin')
+    headers = factory.auth_header(admin)
+
+    response = client.post('/api/v1/admin/reports/jobs', json={'type': 'sales', 'params': {'days': 7}},
+                           headers=headers)
+    assert response.status_code in (200, 202)
+    job_id = response.get_json()['job']['job_id']
+
+    deadline = time.monotonic() + 10
+    result = client.get(f'/api/v1/admin/reports/jobs/{job_id}', headers=headers)
+    while result.get_json()['job']['status'] == 'running' and time.monotonic() < deadline:
+        time.sleep(0.05)
+        result = client.get(f'/api/v1/admin/reports/jobs/{job_id}', headers=headers)
+
+    body = result.get_json()
+    assert body['job']['status'] == 'done'
+    assert body['report']['spec']['params']['days'] == 7
+    assert body['report']['result']['period_days'] == 7
+
+
+def test_unknown_report_type_is_rejected(client, factory):
+    admin = factory.user(role='admin')
+    response = client.post('/api/v1/admin/reports/jobs', json={'type': 'nope'}, headers=factory.auth_header(admin))
+    assert response.status_code == 400
+
+
+def test_restock_forecast_runs_as_job(client, factory):
+    admin = factory.user(role='admin')
+    headers = factory.auth_header(admin)
+    book = factory.textbook(stock_quantity=3)
+    DailySales(day=(datetime.utcnow() - timedelta(days=10)).date(), school_id=book.school_id,
+               category_id=book.category_id, textbook_id=book.id, units=20, amount=0).save()
+
+    response = client.post('/api/v1/admin/reports/restock-forecast', json={'season_start': '2027-04-01'},
+                           headers=headers)
+    assert response.status_code in (200, 202)
+    job_id = response.get_json()['job']['job_id']
+
+    deadline = time.monotonic() + 10
+    result = client.get(f'/api/v1/admin/reports/jobs/{job_id}', headers=headers)
+    while result.get_json()['job']['status'] == 'running' and time.monotonic() < deadline:
+        time.sleep(0.05)
+        result = client.get(f'/api/v1/admin/reports/jobs/{job_id}', headers=headers)
+    assert result.get_json()['job']['status'] == 'done'
+    assert result.get_json()['report']['result']['textbooks'] == 1
+
+    listing = client.get('/api/v1/admin/reports/restock-forecast', headers=headers)
+    assert listing.status_code == 200
+    assert listing.get_json()['forecasts'][0]['season_start'] == '2027-04-01'
@@ -0,0 +1,75 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from extensions import db
+from models.cart import Cart
+from models.category import Category
+from models.school import School
+from models.textbook import Textbook
+from models.user import User
+from utils.auth import user_claims
+from utils.sql_profiler import count_queries
+
+
+@pytest.fixture
+def cart_owner(app):
+    """教科書3冊をカートに入れたユーザー（リクエスト側のセッションから見えるようコミットする）"""
+    school = School(school_name='Profiler High', prefecture='Tokyo', city='Chiyoda', address='1-1')
+    category = Category(category_name='profiler-category')
+    db.session.add_all([school, category])
+    db.session.flush()
+    user = User(
+        username='profiler-user', email='profiler@example.com', password_hash='x',
+        first_name='Taro', last_name='Yamada', school_id=school.id
+    )
+    textbooks = [
+        Textbook(
+            title=f'Book {i}', author='Author', isbn=f'profiler-{i}', price=1000,
+            stock_quantity=10, category_id=category.id, school_id=school.id
+        )
+        for i in range(3)
+    ]
+    db.session.add(user)
+    db.session.add_all(textbooks)
+    db.session.flush()
+    db.session.add_all([Cart(user_id=user.user_id, textbook_id=textbook.id, quantity=1) for textbook in textbooks])
+    db.session.commit()
+    # リクエスト終了時にセッションが破棄されるので、後片付け用の ID は先に取っておく
+    user_id, school_id, category_id = user.user_id, school.id, category.id
+    yield user
+    Cart.query.filter_by(user_id=user_id).delete()
+    User.query.filter_by(user_id=user_id).delete()
+    Textbook.query.filter_by(school_id=school_id).delete()
+    Category.query.filter_by(id=category_id).delete()
+    School.query.filter_by(id=school_id).delete()
+    db.session.commit()
+
+
+def test_get_cart_loads_textbooks_in_the_same_query(app, cart_owner):
+    token = create_access_token(identity=cart_owner.user_id, additional_claims=user_claims(cart_owner))
+    client = app.test_client()
+
+    with count_queries() as stats:
+        response = client.get('/api/v1/orders/cart', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 200
+    assert len(response.get_json()) == 3
+    # トークン失効リストの同期クエリは除き、カートと教科書は JOIN の1回だけ
+    queries = {shape: count for shape, count in stats.shapes.items() if 'revoked_' not in shape}
+    assert list(queries.values()) == [1]
+    assert 'JOIN textbooks' in next(iter(queries))
+
+
+def test_create_order_does_not_load_textbooks_per_line(client, factory):
+    user = factory.user()
+    # 閾値（SQL_N_PLUS_ONE_THRESHOLD=5）を超える行数でも教科書の個別 SELECT が出ないこと
+    for _ in range(6):
+        factory.cart(user, factory.textbook(school=user.school))
+    headers = factory.auth_header(user)
+
+    with count_queries() as stats:
+        response = client.post('/api/v1/orders/', json={'shipping_address': 'Tokyo'}, headers=headers)
+
+    assert response.status_code == 201
+    assert response.get_json()['order']['total_amount'] == 6000
+    assert all(count == 1 for shape, count in stats.shapes.items() if 'FROM textbooks' in shape)
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models.stock_movement import StockMovement, StockSnapshot
+from models.textbook import Textbook
+
+
+def test_decrement_stock_never_goes_negative(factory):
+    book = factory.textbook(stock_quantity=2)
+    other = factory.textbook(school=book.school, category=book.category, stock_quantity=5)
+
+    assert Textbook.decrement_stock({book.id: 2, other.id: 1}) == []
+    assert Textbook.decrement_stock({book.id: 1, other.id: 1}) == [book.id]
+    db.session.rollback()
+    stock = dict(db.session.query(Textbook.id, Textbook.stock_quantity).filter(Textbook.id.in_([book.id, other.id])))
+    assert stock == {book.id: 2, other.id: 5}
+
+
+def test_second_order_for_the_last_copy_is_rejected(client, factory):
+    book = factory.textbook(stock_quantity=1)
+    first, second = factory.user(school=book.school), factory.user(school=book.school)
+    factory.cart(first, book)
+    factory.cart(second, book)
+    book_id = book.id
+    first_headers, second_headers = factory.auth_header(first), factory.auth_header(second)
+
+    assert client.post('/api/v1/orders/', json={}, headers=first_headers).status_code == 201
+    response = client.post('/api/v1/orders/', json={}, headers=second_headers)
+
+    assert response.status_code == 400
+    assert db.session.query(Textbook.stock_quantity).filter(Textbook.id == book_id).scalar() == 0
+
+
+def test_stock_at_rejects_times_before_retained_history(factory):
+    book = factory.textbook(stock_quantity=7)
+    now = datetime.utcnow()
+    StockMovement.record_many([
+        StockMovement.build(book.id, -3, 'order', created_at=now - timedelta(days=30)),
+        StockMovement.build(book.id, 5, 'adjust', created_at=now - timedelta(days=20)),
+    ])
+    db.session.commit()
+    assert StockMovement.stock_at(book.id, now - timedelta(days=25)) == 2
+
+    # 10日前の時点でスナップショットを取り、それ以前の変動を削除
+    StockSnapshot.compact(as_of=now - timedelta(days=10), retention_days=0)
+    assert StockMovement.query.filter_by(textbook_id=book.id).count() == 0
+
+    with pytest.raises(ValueError):
+        StockMovement.stock_at(book.id, now - timedelta(days=25))
+    assert StockMovement.stock_at(book.id, now - timedelta(days=5)) == 7
@@ -0,0 +1,72 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from models.revoked_token import RevokedSubject, RevokedToken
+from utils.token_blocklist import BloomFilter, TokenBlocklist
+
+
+def test_role_change_revokes_tokens_issued_before_it(client, factory):
+    admin_headers = factory.auth_header(factory.user(role='admin'))
+    student = factory.user()
+    student_id = student.user_id
+    old_headers = factory.auth_header(student)
+    assert client.get('/api/v1/orders/', headers=old_headers).status_code == 200
+
+    response = client.put(f'/api/v1/admin/users/{student_id}/role', json={'role': 'admin'}, headers=admin_headers)
+    assert response.status_code == 200
+
+    assert client.get('/api/v1/orders/', headers=old_headers).status_code == 401
+    # 利用者単位の失効は jti とは別のテーブルに入る
+    assert RevokedSubject.active_subjects() == [f'user:{student_id}']
+    assert RevokedToken.active_jtis() == []
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [str(uuid.uuid4()) for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    # 容量内なら偽陽性は誤り率の数倍程度に収まる
+    false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(2000))
+    assert false_positives < 2000 * 0.05
+
+
+def _payload(sub, issued_at):
+    return {'jti': str(uuid.uuid4()), 'sub': sub, 'type': 'user', 'iat': int(issued_at.timestamp())}
+
+
+def test_revocations_from_other_workers_arrive_on_sync(app, factory, monkeypatch):
+    blocklist = TokenBlocklist()
+    issued = datetime.now(timezone.utc) - timedelta(minutes=1)
+    token, other = _payload(1, issued), _payload(2, issued)
+    monkeypatch.setitem(app.config, 'BLOCKLIST_SYNC_SECONDS', 3600)
+    assert not blocklist.is_revoked(token)
+
+    # 別ワーカーでの失効（このインスタンスのフィルタには入らない）
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    RevokedToken.revoke(token['jti'], expires_at)
+    RevokedSubject.revoke(TokenBlocklist.subject_key('user', 2), expires_at)
+    assert not blocklist.is_revoked(token)
+
+    monkeypatch.setitem(app.config, 'BLOCKLIST_SYNC_SECONDS', 0)
+    assert blocklist.is_revoked(token)
+    assert blocklist.is_revoked(other)
+    # 失効後に発行されたトークンは有効
+    assert not blocklist.is_revoked(_payload(2, datetime.now(timezone.utc) + timedelta(seconds=2)))
+
+
+def test_rebuild_drops_expired_entries(app, factory, monkeypatch):
+    blocklist = TokenBlocklist()
+    token = _payload(1, datetime.now(timezone.utc) - timedelta(hours=2))
+    token['exp'] = int((datetime.now(timezone.utc) - timedelta(hours=1)).timestamp())
+    monkeypatch.setitem(app.config, 'BLOCKLIST_REBUILD_SECONDS', 3600)
+    assert not blocklist.is_revoked(token)
+    blocklist.revoke(token)
+    assert token['jti'] in blocklist._current_filter()
+
+    # 作り直しで期限切れの jti はフィルタから消える
+    monkeypatch.setitem(app.config, 'BLOCKLIST_REBUILD_SECONDS', 0)
+    assert not blocklist.is_revoked(token)
+    assert token['jti'] not in blocklist._current_filter()
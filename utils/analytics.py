@@ -0,0 +1,188 @@
+import json
+import os
+import shutil
+from datetime import date, datetime
+
+import numpy as np
+
+from extensions import db
+
+EPOCH = date(1970, 1, 1)
+ORDER_STATUSES = ('pending', 'confirmed', 'shipped', 'delivered', 'cancelled')
+KEEP_SNAPSHOTS = 3
+
+def _table_specs():
+    """スナップショット対象の列定義: テーブル名 -> (SELECT 文, [(列名, dtype)])"""
+    from models.order import Order, OrderItem
+    from models.textbook import Textbook
+    from models.user import User
+    day = (db.func.date(Order.created_at) - db.literal(EPOCH, db.Date))
+    status_code = db.case(
+        *[(Order.status == status, code) for code, status in enumerate(ORDER_STATUSES)],
+        else_=-1
+    )
+    return {
+        'orders': (
+            db.select(Order.id, Order.user_id, User.school_id, day, status_code, Order.total_amount)
+            .select_from(Order).outerjoin(User, User.user_id == Order.user_id)
+            .order_by(Order.id),
+            [('id', np.int64), ('user_id', np.int64), ('school_id', np.int64), ('day', np.int32),
+             ('status', np.int8), ('total_amount', np.float64)]
+        ),
+        # 集計時に結合しないで済むよう、注文日・学校・カテゴリ・ステータスを明細に持たせる
+        'order_items': (
+            db.select(
+                OrderItem.id, OrderItem.order_id, OrderItem.textbook_id, Textbook.category_id,
+                User.school_id, day, status_code, OrderItem.quantity, OrderItem.unit_price, OrderItem.total_price
+            ).select_from(OrderItem)
+            .join(Order, Order.id == OrderItem.order_id)
+            .outerjoin(User, User.user_id == Order.user_id)
+            .join(Textbook, Textbook.id == OrderItem.textbook_id)
+            .order_by(OrderItem.id),
+            [('id', np.int64), ('order_id', np.int64), ('textbook_id', np.int64), ('category_id', np.int64),
+             ('school_id', np.int64), ('day', np.int32), ('status', np.int8), ('quantity', np.int32),
+             ('unit_price', np.float64), ('total_price', np.float64)]
+        ),
+        'textbooks': (
+            db.select(Textbook.id, Textbook.category_id, Textbook.school_id, Textbook.price, Textbook.stock_quantity)
+            .order_by(Textbook.id),
+            [('id', np.int64), ('category_id', np.int64), ('school_id', np.int64), ('price', np.float64),
+             ('stock_quantity', np.int32)]
+        ),
+    }
+
+def _write_table(directory, stmt, columns, chunk_size):
+    """サーバーサイドカーソルでチャンクごとに読み、列ごとの .npy (memmap) に書き込む"""
+    total = db.session.execute(db.select(db.func.count()).select_from(stmt.order_by(None).subquery())).scalar()
+    os.makedirs(directory, exist_ok=True)
+    arrays = {
+        name: np.lib.format.open_memmap(os.path.join(directory, f'{name}.npy'), mode='w+', dtype=dtype, shape=(total,))
+        for name, dtype in columns
+    }
+    written = 0
+    result = db.session.execute(stmt.execution_options(stream_results=True, max_row_buffer=chunk_size))
+    for partition in result.partitions(chunk_size):
+        end = min(written + len(partition), total)
+        values = list(zip(*partition))
+        for (name, _), column in zip(columns, values):
+            arrays[name][written:end] = [-1 if value is None else value for value in column[:end - written]]
+        written = end
+    for array in arrays.values():
+        array.flush()
+    return written
+
+def _write_parquet(directory, columns):
+    """pyarrow があれば同じ列を Parquet でも書き出す（外部ツール用）"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return False
+    table = pa.table({
+        name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+        for name, _ in columns
+    })
+    pq.write_table(table, f'{directory}.parquet')
+    return True
+
+def create_snapshot(data_dir, chunk_size=50000):
+    """orders / order_items / textbooks の列指向スナップショットを作成"""
+    snapshot_id = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    root = os.path.join(data_dir, 'snapshots')
+    path = os.path.join(root, snapshot_id)
+    meta = {'snapshot_id': snapshot_id, 'created_at': datetime.utcnow().isoformat(),
+            'epoch': EPOCH.isoformat(), 'statuses': list(ORDER_STATUSES), 'tables': {}}
+    # 3テーブルを同一時点で読むため REPEATABLE READ で1トランザクションにまとめる
+    db.session.rollback()
+    db.session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+    try:
+        for table, (stmt, columns) in _table_specs().items():
+            directory = os.path.join(path, table)
+            rows = _write_table(directory, stmt, columns, chunk_size)
+            meta['tables'][table] = {
+                'rows': rows,
+                'columns': [name for name, _ in columns],
+                'parquet': _write_parquet(directory, columns)
+            }
+    finally:
+        db.session.rollback()
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    # current を差し替えてから古いスナップショットを削除
+    pointer = os.path.join(data_dir, 'current')
+    with open(f'{pointer}.tmp', 'w', encoding='utf-8') as f:
+        f.write(snapshot_id)
+    os.replace(f'{pointer}.tmp', pointer)
+    for old in sorted(os.listdir(root))[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return meta
+
+class Snapshot:
+    """memmap した列に対する集計ヘルパー"""
+
+    GROUP_KEYS = {
+        'order_items': ('textbook_id', 'category_id', 'school_id', 'day', 'status'),
+        'orders': ('school_id', 'user_id', 'day', 'status'),
+        'textbooks': ('category_id', 'school_id'),
+    }
+    METRICS = {
+        'order_items': ('quantity', 'total_price', 'count'),
+        'orders': ('total_amount', 'count'),
+        'textbooks': ('stock_quantity', 'count'),
+    }
+
+    def __init__(self, data_dir):
+        with open(os.path.join(data_dir, 'current'), encoding='utf-8') as f:
+            snapshot_id = f.read().strip()
+        self.path = os.path.join(data_dir, 'snapshots', snapshot_id)
+        with open(os.path.join(self.path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+    def column(self, table, name):
+        rows = self.meta['tables'][table]['rows']
+        return np.load(os.path.join(self.path, table, f'{name}.npy'), mmap_mode='r')[:rows]
+
+    def aggregate(self, table, metric='count', group_by=None, start_day=None, end_day=None,
+                  status=None, limit=100):
+        """条件で絞り込み、group_by ごとに metric を合計（多い順に limit 件）"""
+        if table not in self.GROUP_KEYS:
+            raise ValueError(f'table must be one of {", ".join(self.GROUP_KEYS)}')
+        if metric not in self.METRICS[table]:
+            raise ValueError(f'metric must be one of {", ".join(self.METRICS[table])}')
+        if group_by and group_by not in self.GROUP_KEYS[table]:
+            raise ValueError(f'group_by must be one of {", ".join(self.GROUP_KEYS[table])}')
+
+        rows = self.meta['tables'][table]['rows']
+        mask = np.ones(rows, dtype=bool)
+        if table != 'textbooks':
+            if start_day or end_day:
+                days = self.column(table, 'day')
+                if start_day:
+                    mask &= days >= (start_day - EPOCH).days
+                if end_day:
+                    mask &= days < (end_day - EPOCH).days
+            if status:
+                if status not in ORDER_STATUSES:
+                    raise ValueError(f'status must be one of {", ".join(ORDER_STATUSES)}')
+                mask &= self.column(table, 'status') == ORDER_STATUSES.index(status)
+
+        values = np.ones(rows, dtype=np.float64) if metric == 'count' else self.column(table, metric)
+        values = values[mask]
+        if not group_by:
+            return [{'value': float(values.sum()), 'rows': int(mask.sum())}]
+
+        keys, inverse = np.unique(self.column(table, group_by)[mask], return_inverse=True)
+        sums = np.bincount(inverse, weights=values, minlength=len(keys))
+        counts = np.bincount(inverse, minlength=len(keys))
+        top = np.argsort(-sums, kind='stable')[:limit]
+
+        result = []
+        for index in top:
+            key = int(keys[index])
+            if group_by == 'day':
+                key = date.fromordinal(EPOCH.toordinal() + key).isoformat()
+            elif group_by == 'status':
+                key = ORDER_STATUSES[key] if 0 <= key < len(ORDER_STATUSES) else None
+            result.append({group_by: key, 'value': float(sums[index]), 'rows': int(counts[index])})
+        return result
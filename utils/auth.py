@@ -0,0 +1,73 @@
+from functools import wraps
+from flask import current_app, jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from utils.cache import cache
+
+class Principal:
+    """キャッシュ用の軽量なユーザー情報"""
+    __slots__ = ('user_id', 'username', 'role', 'school_id', 'full_name', 'is_active')
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+def user_claims(user):
+    """アクセストークンに埋め込むクレーム（権限判定を DB なしで行うため）"""
+    return {'type': 'user', 'role': user.role, 'school_id': user.school_id}
+
+def current_principal():
+    """トークンのユーザー情報（ワーカー内で短時間キャッシュ。ORM オブジェクトではなく dict 相当）"""
+    user_id = get_jwt_identity()
+
+    def load():
+        from models.user import User
+        user = User.find_by_id(user_id)
+        if not user:
+            return None
+        return Principal(
+            user_id=user.user_id,
+            username=user.username,
+            role=user.role,
+            school_id=user.school_id,
+            full_name=user.full_name,
+            is_active=user.is_active
+        )
+
+    return cache.get_or_compute(('principal', user_id), load, current_app.config['PRINCIPAL_CACHE_TTL'])
+
+def invalidate_principal(user_id):
+    """権限・状態の変更時にキャッシュを破棄"""
+    cache.invalidate(('principal', user_id))
+
+def is_admin():
+    """トークンのロールで管理者か判定（ロールを持たない旧トークンはキャッシュ経由で確認）"""
+    claims = get_jwt()
+    if 'role' in claims:
+        return claims['role'] == 'admin'
+    if claims.get('type') == 'school':
+        return False
+    principal = current_principal()
+    return bool(principal and principal.role == 'admin')
+
+def admin_required(fn):
+    """管理者のみ許可し、ビューに current_user（Principal）を渡す"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        if not is_admin():
+            return create_error_response('FORBIDDEN', 'Admin access required', status_code=403)
+        current_user = current_principal()
+        if not current_user or not current_user.is_active:
+            return create_error_response('FORBIDDEN', 'Admin access required', status_code=403)
+        return fn(current_user, *args, **kwargs)
+    return wrapper
+
+def create_success_response(data, status_code=200):
+    return jsonify(data), status_code
+
+def create_error_response(code, message, details=None, status_code=400):
+    """app.py のエラーハンドラーと同じ {"error": {"code", "message"}} 形式"""
+    error = {'code': code, 'message': message}
+    if details:
+        error['details'] = details
+    return jsonify({'error': error}), status_code
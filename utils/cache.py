@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from flask import current_app
+
+class TTLCache:
+    """プロセス内の TTL キャッシュ（期限切れ後も一定時間は古い値を返しつつ裏で再計算）
+
+    max_entries を超えたら、古い値の猶予も過ぎたエントリを捨ててから最も使われていないものを追い出す。
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._locks = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _key_lock(self, key):
+        # 待ち手がいなくなったキーのロックは破棄する
+        with self._lock:
+            holder = self._locks.setdefault(key, [threading.Lock(), 0])
+            holder[1] += 1
+        try:
+            with holder[0]:
+                yield
+        finally:
+            with self._lock:
+                holder[1] -= 1
+                if holder[1] == 0:
+                    self._locks.pop(key, None)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, value, ttl, stale_ttl=0):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (value, now + ttl, now + ttl + stale_ttl)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                for stale_key in [k for k, entry in self._entries.items() if entry[2] <= now]:
+                    del self._entries[stale_key]
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def _refresh_in_background(self, app, key, compute, ttl, stale_ttl):
+        def run():
+            try:
+                with app.app_context():
+                    self._store(key, compute(), ttl, stale_ttl)
+            except Exception:
+                app.logger.exception('Background refresh failed for cache key %s', key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=run, daemon=True).start()
+
+    def get_or_compute(self, key, compute, ttl, stale_ttl=0):
+        """キャッシュ値を返す。期限切れなら stale_ttl の間は古い値を返して再計算"""
+        entry = self._lookup(key)
+        now = time.monotonic()
+        if entry:
+            value, expires_at, stale_until = entry
+            if now < expires_at:
+                return value
+            if now < stale_until:
+                self._refresh_in_background(current_app._get_current_object(), key, compute, ttl, stale_ttl)
+                return value
+
+        # 同じキーの同時ミスでは1リクエストだけが計算する
+        with self._key_lock(key):
+            entry = self._lookup(key)
+            if entry and time.monotonic() < entry[1]:
+                return entry[0]
+            value = compute()
+            self._store(key, value, ttl, stale_ttl)
+            return value
+
+    def invalidate(self, key=None):
+        """キャッシュを破棄（key 省略時は全件）"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+cache = TTLCache()
@@ -0,0 +1,121 @@
+import bisect
+import os
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+# 接続取得待ち時間のヒストグラム境界（秒）
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class PoolMetrics:
+    """コネクションプールの累積カウンタ（ワーカープロセスごと）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.overflow_checkouts = 0
+        self.max_overflow_seen = 0
+        self.wait_total = 0.0
+        self.wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def _observe_wait(self, seconds):
+        self.wait_total += seconds
+        self.wait_counts[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def record_checkout(self, seconds, overflow):
+        with self._lock:
+            self.checkouts += 1
+            self._observe_wait(seconds)
+            if overflow > 0:
+                self.overflow_checkouts += 1
+                self.max_overflow_seen = max(self.max_overflow_seen, overflow)
+
+    def record_timeout(self, seconds):
+        with self._lock:
+            self.timeouts += 1
+            self._observe_wait(seconds)
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            cumulative = 0
+            histogram = []
+            for bound, count in zip(WAIT_BUCKETS + (None,), self.wait_counts):
+                cumulative += count
+                histogram.append({'le': bound if bound is not None else '+Inf', 'count': cumulative})
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'soft_invalidations': self.soft_invalidations,
+                'overflow_checkouts': self.overflow_checkouts,
+                'max_overflow_seen': self.max_overflow_seen,
+                'wait_seconds_total': round(self.wait_total, 6),
+                'wait_seconds_histogram': histogram
+            }
+
+class InstrumentedQueuePool(QueuePool):
+    """接続取得の待ち時間・タイムアウト・オーバーフローを記録する QueuePool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        # dispose 後の新しいプールにもカウンタを引き継ぐ
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - started)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - started, self.overflow())
+        return connection
+
+def instrument_engine(engine):
+    """接続の新規作成・無効化をエンジンのプールのカウンタに加算"""
+    if not isinstance(engine.pool, InstrumentedQueuePool):
+        return
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        engine.pool.metrics.increment('connects')
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        engine.pool.metrics.increment('invalidations')
+
+    @event.listens_for(engine, 'soft_invalidate')
+    def on_soft_invalidate(dbapi_connection, connection_record, exception):
+        engine.pool.metrics.increment('soft_invalidations')
+
+def pool_status(engine):
+    """現在のプール状態と累積メトリクス"""
+    pool = engine.pool
+    status = {'pid': os.getpid(), 'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow()
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        status['metrics'] = pool.metrics.snapshot()
+    return status
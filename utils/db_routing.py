@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app, g, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from extensions import db, REPLICA_BIND
+
+READ_METHODS = ('GET', 'HEAD')
+
+def replica_configured(app=None):
+    app = app or current_app
+    return REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+class RecentWrites:
+    """ユーザーごとの直近の書き込み時刻（SQLite ファイルで同一ホストのワーカー間に共有）"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _connection(self, path):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS recent_writes (user_key TEXT PRIMARY KEY, written_at REAL NOT NULL)')
+            self._local.conn = conn
+            self._local.path = path
+        return conn
+
+    def mark(self, path, user_key, window):
+        conn = self._connection(path)
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO recent_writes (user_key, written_at) VALUES (?, ?)', (user_key, now))
+        conn.execute('DELETE FROM recent_writes WHERE written_at < ?', (now - window,))
+
+    def is_recent(self, path, user_key, window):
+        row = self._connection(path).execute(
+            'SELECT written_at FROM recent_writes WHERE user_key = ?', (user_key,)
+        ).fetchone()
+        return bool(row) and time.time() - row[0] < window
+
+recent_writes = RecentWrites()
+
+class ReplicaLag:
+    """レプリカの遅延秒数（ワーカーごとに一定間隔でだけ問い合わせる）"""
+
+    def __init__(self):
+        self._checked_at = 0
+        self._lag = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        interval = current_app.config['REPLICA_LAG_CHECK_SECONDS']
+        if time.monotonic() - self._checked_at < interval:
+            return self._lag
+        with self._lock:
+            if time.monotonic() - self._checked_at >= interval:
+                self._lag = self._measure()
+                self._checked_at = time.monotonic()
+            return self._lag
+
+    @staticmethod
+    def _measure():
+        """プライマリの現在の WAL 位置まで再生済みなら 0、未再生なら最後の再生からの秒数
+
+        受信側との比較だとストリーミングが止まっても 0 になるため、プライマリの位置と比べる。
+        測れないとき（レプリカでない・接続できない）は None でプライマリに倒す。
+        """
+        try:
+            with db.engine.connect() as conn:
+                primary_lsn = conn.execute(db.text('SELECT pg_current_wal_lsn()::text')).scalar()
+            with db.get_engine(bind=REPLICA_BIND).connect() as conn:
+                behind_bytes, lag_seconds = conn.execute(db.text(
+                    'SELECT pg_wal_lsn_diff(CAST(:primary_lsn AS pg_lsn), pg_last_wal_replay_lsn()), '
+                    'EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())'
+                ), {'primary_lsn': primary_lsn}).one()
+        except Exception:
+            current_app.logger.warning('Replica lag check failed; reading from primary', exc_info=True)
+            return None
+        if behind_bytes is None:
+            current_app.logger.warning('Replica is not in recovery; reading from primary')
+            return None
+        if behind_bytes <= 0:
+            return 0
+        if lag_seconds is None:
+            return None
+        return float(lag_seconds)
+
+replica_lag = ReplicaLag()
+
+def _user_key():
+    """ユーザーと学校で ID が重ならないようトークン種別を付けたキー"""
+    try:
+        claims = get_jwt()
+    except RuntimeError:
+        return None
+    if not claims:
+        return None
+    return f"{claims.get('type', 'user')}:{claims['sub']}"
+
+def _should_use_replica():
+    config = current_app.config
+    if request.method not in READ_METHODS or not replica_configured():
+        return False
+    verify_jwt_in_request(optional=True)
+    user_key = _user_key()
+    if user_key and recent_writes.is_recent(config['READ_YOUR_WRITES_DB'], user_key, config['READ_YOUR_WRITES_SECONDS']):
+        return False
+    lag = replica_lag.current()
+    return lag is not None and lag <= config['REPLICA_MAX_LAG_SECONDS']
+
+def route_reads(app, routes):
+    """GET をレプリカに振り分ける（routes はブループリント名 → 関数名の集合、None ならそのブループリント全体）
+
+    ブループリントはモジュール単位で共有されるため、フックは create_app ごとにアプリ側へ1つだけ登録する。
+    """
+    @app.before_request
+    def use_replica_for_reads():
+        if request.blueprint not in routes:
+            return
+        endpoints = routes[request.blueprint]
+        if endpoints is not None and request.endpoint.rsplit('.', 1)[-1] not in endpoints:
+            return
+        try:
+            g.use_replica = _should_use_replica()
+        except Exception:
+            # トークン不正などはビュー側の jwt_required に任せ、読み取りはプライマリへ
+            g.use_replica = False
+
+def init_app(app):
+    """書き込みに成功したユーザーを記録し、一定時間はプライマリから読ませる"""
+    if not replica_configured(app):
+        return
+
+    @app.after_request
+    def remember_writes(response):
+        if request.method not in READ_METHODS + ('OPTIONS',) and response.status_code < 400:
+            user_key = _user_key()
+            if user_key:
+                recent_writes.mark(
+                    app.config['READ_YOUR_WRITES_DB'], user_key, app.config['READ_YOUR_WRITES_SECONDS']
+                )
+        return response
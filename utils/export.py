@@ -0,0 +1,36 @@
+import csv
+import io
+from datetime import date, datetime
+
+def _format(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def iter_csv(header, rows, flush_every=500, bom=False):
+    """行を CSV 文字列のチャンクとして逐次返す（全体をメモリに載せない）"""
+    if bom:
+        # Excel で日本語が文字化けしないよう BOM を付与
+        yield '\ufeff'
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for index, row in enumerate(rows, 1):
+        writer.writerow([_format(value) for value in row])
+        if index % flush_every == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+def write_xlsx(header, rows, fileobj, sheet_title='export'):
+    """write_only モードで XLSX を書き出す（openpyxl が必要）"""
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append(list(header))
+    for row in rows:
+        sheet.append(list(row))
+    workbook.save(fileobj)
+    fileobj.seek(0)
+    return fileobj
@@ -0,0 +1,62 @@
+import math
+from datetime import date, timedelta
+
+import numpy as np
+
+def next_season_start(today=None, month=4, day=1):
+    """次の発注シーズン開始日（既定は4月1日）"""
+    today = today or date.today()
+    start = date(today.year, month, day)
+    return start if start > today else date(today.year + 1, month, day)
+
+def weekly_demand_matrix(textbook_ids, week_indexes, units, n_weeks):
+    """(教科書, 週, 冊数) の疎な行を教科書×週の密行列に集約
+
+    学校の軸は事前に合算して渡す（10万冊×千校×週の立方体はメモリに載らないため）。
+    """
+    titles, title_index = np.unique(textbook_ids, return_inverse=True)
+    flat = title_index.astype(np.int64) * n_weeks + week_indexes
+    matrix = np.bincount(flat, weights=units, minlength=len(titles) * n_weeks)
+    return titles, matrix.reshape(len(titles), n_weeks).astype(np.float32)
+
+def forecast_demand(matrix, lead_weeks, season_weeks, trend_weeks=13, z=1.65):
+    """教科書ごとの次シーズン需要予測と安全在庫をベクトル演算で算出
+
+    matrix の最終列が今週。前年同時期のシーズン需要に直近の前年比トレンドを掛け、
+    前年実績がない教科書は全期間の週平均×シーズン週数で代替する。
+    """
+    n_titles, n_weeks = matrix.shape
+    now = n_weeks - 1
+
+    # 前年同シーズンの需要
+    season_start = now + lead_weeks - 52
+    lo, hi = max(season_start, 0), min(season_start + season_weeks, n_weeks)
+    last_season = matrix[:, lo:hi].sum(axis=1) if hi > lo else np.zeros(n_titles, dtype=np.float32)
+
+    # 直近 trend_weeks 週と前年同期間の比（0.5〜2.0 に制限）
+    recent = matrix[:, max(now - trend_weeks + 1, 0):now + 1].sum(axis=1)
+    prev_lo = max(now - 52 - trend_weeks + 1, 0)
+    prev_hi = max(now - 52 + 1, 0)
+    previous = matrix[:, prev_lo:prev_hi].sum(axis=1)
+    trend = np.divide(recent, previous, out=np.ones_like(recent), where=previous > 0)
+    trend = np.clip(trend, 0.5, 2.0)
+
+    fallback = matrix.mean(axis=1) * season_weeks
+    forecast = np.where(last_season > 0, last_season * trend, fallback)
+
+    safety = z * matrix.std(axis=1) * math.sqrt(season_weeks)
+    return forecast.astype(np.float32), safety.astype(np.float32)
+
+def recommend_orders(forecast, safety, stock):
+    """推奨発注数 = 予測需要 + 安全在庫 - 現在庫（0 未満は 0）"""
+    return np.maximum(np.ceil(forecast + safety - stock), 0).astype(np.int64)
+
+def week_index(days_since_start):
+    """履歴開始日からの経過日数を週番号に変換"""
+    return np.asarray(days_since_start, dtype=np.int64) // 7
+
+def history_start(weeks, today=None):
+    """履歴の開始日（週の境界に揃える）"""
+    today = today or date.today()
+    start = today - timedelta(weeks=weeks - 1)
+    return start - timedelta(days=start.weekday())
@@ -0,0 +1,14 @@
+from datetime import datetime
+from flask import request
+
+def parse_datetime_arg(name, default=None):
+    """クエリパラメータを ISO 8601 日時として取得（不正な値は ValueError）"""
+    value = request.args.get(name)
+    if not value:
+        return default
+    return datetime.fromisoformat(value)
+
+def parse_include_arg():
+    """include=items,... 形式のパラメータを集合で取得"""
+    value = request.args.get('include', '')
+    return {part.strip() for part in value.split(',') if part.strip()}
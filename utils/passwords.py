@@ -0,0 +1,119 @@
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+_dummy_hash = None
+
+# werkzeug が省略時に使う scrypt のパラメータ (n, r, p)
+SCRYPT_DEFAULTS = (2 ** 15, 8, 1)
+
+class PasswordHashBusy(Exception):
+    """ハッシュ待ちが上限を超えた（呼び出し側は 503 を返す）"""
+
+def _pool():
+    """プロセスプールと待ち枠（どちらも gunicorn ワーカーごと。ホスト全体の上限ではない）"""
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            config = current_app.config
+            _executor = ProcessPoolExecutor(max_workers=config['PASSWORD_HASH_WORKERS'])
+            _slots = threading.BoundedSemaphore(config['PASSWORD_HASH_QUEUE_LIMIT'])
+        return _executor
+
+def _acquire_slot():
+    if not _slots.acquire(timeout=current_app.config['PASSWORD_HASH_QUEUE_TIMEOUT']):
+        raise PasswordHashBusy('Password hashing queue is full')
+
+def _run(fn, *args):
+    """プロセスプールで実行（実行中+待ちの件数が上限なら一定時間待って諦める）"""
+    executor = _pool()
+    _acquire_slot()
+    try:
+        return executor.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+def hash_password(password):
+    """設定中のコストでハッシュ化"""
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+def reject_unknown_account(password):
+    """存在しないアカウントでも照合1回分の時間をかけて False を返す（応答時間で登録有無を漏らさない）"""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(secrets.token_urlsafe(16))
+    verify_password(_dummy_hash, password)
+    return False
+
+def _normalize_method(method):
+    """'pbkdf2:sha256' のような省略形も werkzeug の既定値で補って比較できる形にする"""
+    name, *params = method.split(':')
+    if name == 'pbkdf2':
+        hash_name = params[0] if params and params[0] else 'sha256'
+        iterations = int(params[1]) if len(params) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return (name, hash_name, iterations)
+    if name == 'scrypt':
+        values = tuple(int(value) for value in params[:3])
+        return (name, *values, *SCRYPT_DEFAULTS[len(values):])
+    return (name, *params)
+
+def needs_rehash(password_hash):
+    """ハッシュのアルゴリズム・コストが現在の設定と異なるか"""
+    return _normalize_method(password_hash.split('$', 1)[0]) != _normalize_method(
+        current_app.config['PASSWORD_HASH_METHOD']
+    )
+
+def _hash_chunk(passwords, method):
+    return [generate_password_hash(password, method) for password in passwords]
+
+def hash_many(passwords, chunksize=16):
+    """複数のパスワードをプロセスプールで並列にハッシュ化（入力順で返す）
+
+    ログインと同じ待ち枠を使い、同時に持つ枠は PASSWORD_HASH_BATCH_SLOTS までに抑える。
+    """
+    passwords = list(passwords)
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    executor = _pool()
+    chunks = [passwords[i:i + chunksize] for i in range(0, len(passwords), chunksize)]
+    max_in_flight = current_app.config['PASSWORD_HASH_BATCH_SLOTS']
+    in_flight = deque()
+    hashes = []
+    try:
+        for chunk in chunks:
+            if len(in_flight) >= max_in_flight:
+                future = in_flight.popleft()
+                try:
+                    hashes.extend(future.result())
+                finally:
+                    _slots.release()
+            _acquire_slot()
+            try:
+                in_flight.append(executor.submit(_hash_chunk, chunk, method))
+            except BaseException:
+                _slots.release()
+                raise
+        while in_flight:
+            future = in_flight.popleft()
+            try:
+                hashes.extend(future.result())
+            finally:
+                _slots.release()
+    finally:
+        # 途中で失敗しても、投入済みのチャンクが終わるまで枠は返さない
+        for future in in_flight:
+            try:
+                future.result()
+            except Exception:
+                pass
+            finally:
+                _slots.release()
+    return hashes
@@ -0,0 +1,89 @@
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from flask import current_app, request
+
+class TokenBucketLimiter:
+    """SQLite ファイルに状態を置くトークンバケット（同一ホストの全ワーカーで共有）"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _connection(self, path):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.conn = conn
+            self._local.path = path
+        return conn
+
+    def consume(self, path, limits, cost=1):
+        """limits=[(キー, 容量, 毎秒の補充量)] のすべてから1トークン取る
+
+        1つでも足りなければどれも消費せず、次に取れるまでの秒数を返す（取れたら 0）。
+        """
+        conn = self._connection(path)
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            states = []
+            retry_after = 0
+            for key, capacity, rate in limits:
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                if tokens < cost:
+                    retry_after = max(retry_after, (cost - tokens) / rate)
+                states.append((key, tokens))
+            if not retry_after:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                    [(key, tokens - cost, now) for key, tokens in states]
+                )
+            # 満タンに戻ったバケットはときどき掃除する
+            if random.random() < 0.01:
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - 86400,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return math.ceil(retry_after)
+
+login_limiter = TokenBucketLimiter()
+
+def validate_config(config):
+    """補充量 0 以下だと待ち秒数の計算で割れないため、起動時に弾く"""
+    for name in ('LOGIN_RATE_LIMIT_ID_PER_MINUTE', 'LOGIN_RATE_LIMIT_IP_PER_MINUTE'):
+        if config[name] <= 0:
+            raise ValueError(f'{name} must be greater than 0')
+
+def check_login_rate(login_id):
+    """ログイン試行を ID 単位・IP 単位で制限（パスワード照合より前に呼ぶ）
+
+    IP はプロキシ越しでも利用者ごとに分かれるよう、app.py の ProxyFix（PROXY_FIX_X_FOR）適用後の値を使う。
+
+    制限中なら Retry-After 秒数、許可なら 0 を返す。
+    """
+    config = current_app.config
+    if not config['LOGIN_RATE_LIMIT_ENABLED']:
+        return 0
+    limits = [
+        (f'ip:{request.remote_addr}', config['LOGIN_RATE_LIMIT_IP_BURST'], config['LOGIN_RATE_LIMIT_IP_PER_MINUTE'] / 60),
+    ]
+    if login_id:
+        limits.append((
+            f'id:{str(login_id).strip().lower()}',
+            config['LOGIN_RATE_LIMIT_ID_BURST'],
+            config['LOGIN_RATE_LIMIT_ID_PER_MINUTE'] / 60
+        ))
+    return login_limiter.consume(config['LOGIN_RATE_LIMIT_DB'], limits)
@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from flask import current_app
+
+from extensions import db
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# 直近 days 日を対象にするレポート種別 -> 既定の日数
+RELATIVE_WINDOWS = {
+    'sales': 365,
+}
+
+# 実行日（today）を基準にするレポート種別
+AS_OF_REPORTS = ('restock_forecast',)
+
+def _window_start(days):
+    return (datetime.utcnow() - timedelta(days=days)).date()
+
+def _sales_report(params):
+    from models.sales_rollup import DailySales, DailyOrderTotals
+    days = int(params.get('days', RELATIVE_WINDOWS['sales']))
+    bucket = params.get('bucket', 'month')
+    breakdown = params.get('breakdown')
+    start_day = date.fromisoformat(params['start_day']) if params.get('start_day') else _window_start(days)
+    report = {'period_days': days, 'bucket': bucket, 'breakdown': breakdown}
+    report.update(DailyOrderTotals.totals(start_day))
+    if breakdown in (None, 'school'):
+        report['series'] = DailyOrderTotals.series(start_day, bucket=bucket, by_school=breakdown == 'school')
+    else:
+        report['series'] = DailySales.series(start_day, bucket=bucket, breakdown=breakdown)
+    return report
+
+def _inventory_valuation_report(params):
+    from models.textbook import Textbook
+    group_by = params.get('group_by', 'category')
+    rows = Textbook.inventory_valuation(group_by)
+    return {
+        'group_by': group_by,
+        'rows': rows,
+        'total_value': sum(row['value'] for row in rows),
+        'total_units': sum(row['units'] for row in rows)
+    }
+
+def _orders_xlsx_export(params, artifact_path):
+    from models.order import Order
+    from utils.export import write_xlsx
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    rows = Order.export_lines(
+        start_date=datetime.fromisoformat(start_date) if start_date else None,
+        end_date=datetime.fromisoformat(end_date) if end_date else None,
+        status=params.get('status')
+    )
+    counted = {'rows': 0}
+    def counting(rows):
+        for row in rows:
+            counted['rows'] += 1
+            yield row
+    tmp_path = f'{artifact_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            write_xlsx(Order.EXPORT_COLUMNS, counting(rows), f, sheet_title='orders')
+        os.replace(tmp_path, artifact_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {'format': 'xlsx', 'rows': counted['rows']}
+
+def _restock_forecast_job(params):
+    """需要予測を再計算して restock_forecasts を置き換える（結果は件数のみ）"""
+    from models.restock_forecast import RestockForecast
+    config = current_app.config
+    season_start = date.fromisoformat(params['season_start']) if params.get('season_start') else None
+    count = RestockForecast.generate(
+        season_start=season_start,
+        season_weeks=int(params.get('season_weeks', config['RESTOCK_SEASON_WEEKS'])),
+        history_weeks=int(params.get('history_weeks', config['RESTOCK_HISTORY_WEEKS'])),
+        today=date.fromisoformat(params['today'])
+    )
+    return {'textbooks': count}
+
+def _sales_sources():
+    from models.sales_rollup import DailySales, DailyOrderTotals
+    return (DailyOrderTotals, DailySales)
+
+def _inventory_sources():
+    from models.stock_movement import StockMovement
+    from models.textbook import Textbook
+    return (Textbook, StockMovement)
+
+def _restock_sources():
+    from models.sales_rollup import DailySales
+    from models.textbook import Textbook
+    return (DailySales, Textbook)
+
+def _orders_sources():
+    from models.order import Order, OrderItem
+    return (Order, OrderItem)
+
+# レポート種別 -> (集計関数, データバージョンの元になるモデル)
+REPORTS = {
+    'sales': (_sales_report, _sales_sources),
+    'inventory_valuation': (_inventory_valuation_report, _inventory_sources),
+    'orders_xlsx': (_orders_xlsx_export, _orders_sources),
+    'restock_forecast': (_restock_forecast_job, _restock_sources),
+}
+
+# ファイルを出力するレポート種別 -> 拡張子（集計関数に出力先パスを渡す）
+ARTIFACTS = {
+    'orders_xlsx': 'xlsx',
+}
+
+def data_version(models):
+    """対象テーブルの件数と最終更新時刻から、データの版を1クエリで算出"""
+    columns = []
+    for model in models:
+        columns.append(db.session.query(db.func.count()).select_from(model).scalar_subquery())
+        columns.append(db.session.query(db.func.max(model.updated_at)).scalar_subquery())
+    row = db.session.query(*columns).one()
+    return hashlib.sha1(repr(tuple(row)).encode('utf-8')).hexdigest()
+
+class ReportJobManager:
+    """重いレポートをワーカープールで計算し、結果をディスクにキャッシュする
+
+    ジョブ ID は「レポート指定＋データの版」のハッシュなので、どの gunicorn ワーカーからでも
+    同じファイルを参照して状態を確認できる。
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self, app):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=app.config['REPORT_WORKERS'],
+                    thread_name_prefix='report-job'
+                )
+            return self._executor
+
+    def _path(self, job_id, suffix):
+        cache_dir = current_app.config['REPORT_CACHE_DIR']
+        os.makedirs(cache_dir, exist_ok=True)
+        return os.path.join(cache_dir, f'{job_id}.{suffix}')
+
+    @staticmethod
+    def _write_atomic(path, payload):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def normalize_spec(spec):
+        """レポート指定を検証し、ハッシュ用に正規化"""
+        if not isinstance(spec, dict) or spec.get('type') not in REPORTS:
+            raise ValueError(f'type must be one of {", ".join(REPORTS)}')
+        params = spec.get('params') or {}
+        if not isinstance(params, dict):
+            raise ValueError('params must be an object')
+        if spec['type'] in RELATIVE_WINDOWS and not params.get('start_day'):
+            # 実行時に utcnow() で解決すると、同じ指定のキャッシュが後日の別の期間として返ってしまう
+            days = int(params.get('days', RELATIVE_WINDOWS[spec['type']]))
+            params = {**params, 'days': days, 'start_day': _window_start(days).isoformat()}
+        if spec['type'] in AS_OF_REPORTS and not params.get('today'):
+            params = {**params, 'today': datetime.utcnow().date().isoformat()}
+        return {'type': spec['type'], 'params': params}
+
+    def submit(self, spec):
+        """ジョブを投入。同じ指定・同じデータの版なら既存の結果をそのまま返す"""
+        spec = self.normalize_spec(spec)
+        _, sources = REPORTS[spec['type']]
+        version = data_version(sources())
+        job_id = hashlib.sha256(
+            json.dumps({'spec': spec, 'version': version}, sort_keys=True).encode('utf-8')
+        ).hexdigest()[:32]
+
+        status = self.status(job_id)
+        if status['status'] in ('done', 'running'):
+            return status
+
+        self._remove(self._path(job_id, 'error'))
+        self._write_atomic(self._path(job_id, 'running'), {'spec': spec, 'started_at': time.time()})
+        app = current_app._get_current_object()
+        self._pool(app).submit(self._run, app, job_id, spec)
+        return {'job_id': job_id, 'status': 'running'}
+
+    def _run(self, app, job_id, spec):
+        with app.app_context():
+            running_path = self._path(job_id, 'running')
+            try:
+                compute, _ = REPORTS[spec['type']]
+                if spec['type'] in ARTIFACTS:
+                    result = compute(spec['params'], self._path(job_id, ARTIFACTS[spec['type']]))
+                else:
+                    result = compute(spec['params'])
+                self._write_atomic(self._path(job_id, 'json'), {
+                    'spec': spec,
+                    'generated_at': datetime.utcnow().isoformat(),
+                    'result': result
+                })
+            except Exception as e:
+                app.logger.exception('Report job %s failed', job_id)
+                self._write_atomic(self._path(job_id, 'error'), {'spec': spec, 'error': str(e)})
+            finally:
+                self._remove(running_path)
+                db.session.remove()
+
+    def status(self, job_id):
+        """ジョブの状態（done / running / failed / not_found）"""
+        if not JOB_ID_PATTERN.match(job_id):
+            return {'job_id': job_id, 'status': 'not_found'}
+        if os.path.exists(self._path(job_id, 'json')):
+            return {'job_id': job_id, 'status': 'done'}
+        error_path = self._path(job_id, 'error')
+        if os.path.exists(error_path):
+            with open(error_path, encoding='utf-8') as f:
+                return {'job_id': job_id, 'status': 'failed', 'error': json.load(f).get('error')}
+        running_path = self._path(job_id, 'running')
+        try:
+            started_at = os.path.getmtime(running_path)
+        except FileNotFoundError:
+            return {'job_id': job_id, 'status': 'not_found'}
+        # ワーカーが落ちて残ったマーカーはタイムアウト後に無効扱い
+        if time.time() - started_at > current_app.config['REPORT_JOB_TIMEOUT']:
+            return {'job_id': job_id, 'status': 'not_found'}
+        return {'job_id': job_id, 'status': 'running'}
+
+    def load_result(self, job_id):
+        """完了したジョブの結果を読み込む（未完了なら None）"""
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def artifact_path(self, job_id):
+        """完了したジョブの出力ファイルのパスと拡張子（無ければ None）"""
+        result = self.load_result(job_id)
+        if result is None or result['spec']['type'] not in ARTIFACTS:
+            return None
+        suffix = ARTIFACTS[result['spec']['type']]
+        path = self._path(job_id, suffix)
+        if not os.path.exists(path):
+            return None
+        return path, suffix
+
+    def prune(self, max_age):
+        """max_age 秒より古いキャッシュファイルを削除"""
+        cache_dir = current_app.config['REPORT_CACHE_DIR']
+        if not os.path.isdir(cache_dir):
+            return 0
+        removed = 0
+        cutoff = time.time() - max_age
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.endswith('.running'):
+                continue
+            if os.path.getmtime(path) < cutoff:
+                self._remove(path)
+                removed += 1
+        return removed
+
+report_jobs = ReportJobManager()
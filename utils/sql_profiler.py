@@ -0,0 +1,126 @@
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+_WHITESPACE = re.compile(r'\s+')
+# IN (%(p_1)s, %(p_2)s, ...) の要素数違いを同じ形として扱う
+_PARAM_LIST = re.compile(r'\(\s*(?:%\(\w+\)s|\?)(?:\s*,\s*(?:%\(\w+\)s|\?))*\s*\)')
+
+class NPlusOneDetected(Exception):
+    """同じ形の SQL が1リクエスト内で閾値回以上実行された（SQL_N_PLUS_ONE_RAISE 時のみ送出）"""
+
+def statement_shape(statement):
+    return _PARAM_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+class QueryStats:
+    """1リクエスト（または count_queries ブロック）内の SQL 集計"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        self.shapes = {}
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+            self.slowest_statement = statement
+        shape = statement_shape(statement)
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        return self.shapes[shape]
+
+    def repeated(self, threshold):
+        """閾値回以上繰り返された SQL の形（N+1 の候補）"""
+        return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+_collectors = threading.local()
+
+@contextmanager
+def count_queries():
+    """ブロック内で実行された SQL を数える（テストでのクエリ数上限の確認用）
+
+        with count_queries() as stats:
+            client.get('/api/v1/orders/cart')
+        assert stats.count <= 2
+    """
+    stats = QueryStats()
+    stack = _collectors.__dict__.setdefault('stack', [])
+    stack.append(stats)
+    try:
+        yield stats
+    finally:
+        stack.remove(stats)
+
+def instrument_queries(engine):
+    """実行時間を計測し、現在のリクエストと count_queries に記録
+
+    開始時刻は実行ごとの context に持たせる（接続に積むと、例外で after が呼ばれなかった分が残り続ける）。
+    """
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        for stats in getattr(_collectors, 'stack', ()):
+            stats.record(statement, elapsed)
+        if not has_request_context() or 'sql_stats' not in g:
+            return
+        repeats = g.sql_stats.record(statement, elapsed)
+        config = current_app.config
+        if config['SQL_N_PLUS_ONE_RAISE'] and repeats == config['SQL_N_PLUS_ONE_THRESHOLD']:
+            raise NPlusOneDetected(f'{repeats} identical queries in {request.endpoint}: {statement_shape(statement)[:200]}')
+
+def init_app(app, engines):
+    """リクエストごとの SQL 件数・時間を Server-Timing ヘッダーと構造化ログに出す"""
+    if not app.config['SQL_PROFILING_ENABLED']:
+        return
+    for engine in engines:
+        instrument_queries(engine)
+
+    @app.before_request
+    def start_sql_stats():
+        g.sql_stats = QueryStats()
+
+    @app.after_request
+    def report_sql_stats(response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        response.headers.add(
+            'Server-Timing', f'db;dur={stats.total * 1000:.1f};desc="{stats.count} queries"'
+        )
+        if stats.count:
+            response.headers.add('Server-Timing', f'db-slowest;dur={stats.slowest * 1000:.1f}')
+
+        config = app.config
+        repeated = stats.repeated(config['SQL_N_PLUS_ONE_THRESHOLD'])
+        record = {
+            'event': 'sql_profile',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.total * 1000, 2),
+            'slowest_ms': round(stats.slowest * 1000, 2),
+            'slowest_statement': statement_shape(stats.slowest_statement)[:500] if stats.slowest_statement else None
+        }
+        if repeated:
+            record['n_plus_one'] = [
+                {'statement': shape[:500], 'count': count}
+                for shape, count in sorted(repeated.items(), key=lambda item: -item[1])
+            ]
+            app.logger.warning(json.dumps(record, ensure_ascii=False))
+        elif config['SQL_PROFILING_LOG'] or stats.total * 1000 >= config['SQL_SLOW_REQUEST_MS']:
+            app.logger.info(json.dumps(record, ensure_ascii=False))
+        return response
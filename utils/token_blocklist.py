@@ -0,0 +1,136 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+
+class BloomFilter:
+    """jti 用のブルームフィルタ（偽陽性はあり得るが偽陰性はない）"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class TokenBlocklist:
+    """DB の失効リストの前段に置くワーカー内ブルームフィルタ
+
+    フィルタに無い jti は I/O なしで有効と判定し、フィルタに当たった場合だけ DB で確認する。
+    他ワーカーでの失効は BLOCKLIST_SYNC_SECONDS ごとの差分取り込みで反映し、
+    期限切れエントリを落とすため BLOCKLIST_REBUILD_SECONDS ごとに作り直す。
+    """
+
+    def __init__(self):
+        self._filter = None
+        self._built_at = 0
+        self._synced_at = 0
+        self._synced_since = None
+        self._lock = threading.Lock()
+
+    def _rebuild(self, config):
+        from models.revoked_token import RevokedToken, RevokedSubject
+        started = datetime.utcnow()
+        keys = RevokedToken.active_jtis()
+        keys += [self._bloom_key(subject) for subject in RevokedSubject.active_subjects()]
+        bloom = BloomFilter(max(len(keys) * 2, config['BLOCKLIST_BLOOM_CAPACITY']), config['BLOCKLIST_BLOOM_ERROR_RATE'])
+        for key in keys:
+            bloom.add(key)
+        self._filter = bloom
+        self._built_at = self._synced_at = time.monotonic()
+        self._synced_since = started
+
+    def _sync(self):
+        from models.revoked_token import RevokedToken, RevokedSubject
+        # 他ワーカーのコミットとの時刻ずれを吸収するため少し遡って取り込む
+        started = datetime.utcnow()
+        since = self._synced_since - timedelta(seconds=5)
+        for jti in RevokedToken.active_jtis(since=since):
+            self._filter.add(jti)
+        for subject in RevokedSubject.active_subjects(since=since):
+            self._filter.add(self._bloom_key(subject))
+        self._synced_at = time.monotonic()
+        self._synced_since = started
+
+    def _current_filter(self):
+        config = current_app.config
+        now = time.monotonic()
+        if (self._filter is not None
+                and now - self._synced_at < config['BLOCKLIST_SYNC_SECONDS']
+                and now - self._built_at < config['BLOCKLIST_REBUILD_SECONDS']):
+            return self._filter
+        with self._lock:
+            now = time.monotonic()
+            if (self._filter is None
+                    or now - self._built_at >= config['BLOCKLIST_REBUILD_SECONDS']
+                    or self._filter.count > self._filter.capacity):
+                self._rebuild(config)
+            elif now - self._synced_at >= config['BLOCKLIST_SYNC_SECONDS']:
+                self._sync()
+            return self._filter
+
+    @staticmethod
+    def subject_key(token_type, subject):
+        """利用者単位の失効エントリのキー（ユーザーと学校で ID が重ならないよう種別を付ける）"""
+        return f'{token_type}:{subject}'
+
+    @staticmethod
+    def _bloom_key(subject_key):
+        """jti と同じフィルタに入れるので接頭辞で区別する"""
+        return f'subject:{subject_key}'
+
+    def is_revoked(self, jwt_payload):
+        from models.revoked_token import RevokedToken, RevokedSubject
+        bloom = self._current_filter()
+        jti = jwt_payload['jti']
+        if jti in bloom and RevokedToken.is_revoked(jti):
+            return True
+        key = self.subject_key(jwt_payload.get('type', 'user'), jwt_payload['sub'])
+        if self._bloom_key(key) not in bloom:
+            return False
+        revoked_at = RevokedSubject.revoked_at_for(key)
+        if revoked_at is None:
+            return False
+        # iat は秒単位なので、失効と同じ秒に発行されたトークンも無効側に倒す
+        return jwt_payload.get('iat', 0) <= (revoked_at - datetime(1970, 1, 1)).total_seconds()
+
+    def revoke(self, jwt_payload):
+        """トークンを失効させる（exp まで保持）"""
+        from models.revoked_token import RevokedToken
+        if jwt_payload.get('exp'):
+            expires_at = datetime.utcfromtimestamp(jwt_payload['exp'])
+        else:
+            expires_at = datetime.utcnow() + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+        RevokedToken.revoke(jwt_payload['jti'], expires_at)
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jwt_payload['jti'])
+
+    def revoke_subject(self, token_type, subject, commit=True):
+        """ロール変更・無効化時に、その利用者の発行済みトークンをすべて失効させる"""
+        from models.revoked_token import RevokedSubject
+        key = self.subject_key(token_type, subject)
+        # 発行済みトークンのうち最も長いリフレッシュトークンが切れるまで保持
+        expires_at = datetime.utcnow() + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+        RevokedSubject.revoke(key, expires_at, commit=commit)
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(self._bloom_key(key))
+
+token_blocklist = TokenBlocklist()
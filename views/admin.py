@@ -1,21 +1,54 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app, Response, send_file, stream_with_context, url_for
+from flask_jwt_extended import jwt_required
+from marshmallow import Schema, fields, validate, ValidationError
+from sqlalchemy.orm import joinedload
 from models.user import User
 from models.textbook import Textbook
 from models.order import Order
 from models.school import School
 from models.category import Category
+from models.stock_movement import StockMovement
+from models.restock_forecast import RestockForecast
 from extensions import db
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import csv
+import io
+from utils.params import parse_datetime_arg
+from utils.export import iter_csv
+from utils.report_jobs import report_jobs
+from utils.analytics import Snapshot
+from utils.passwords import PasswordHashBusy
+from utils.auth import is_admin, invalidate_principal
+from utils.db_metrics import pool_status
+from utils.cache import cache
+from utils.token_blocklist import token_blocklist
+from models.base_model import unit_of_work
 
 admin_bp = Blueprint('admin', __name__)
 
+class BulkOrderStatusSchema(Schema):
+    """注文ステータス一括更新（order_ids かフィルターのどちらかで対象を指定）"""
+    status = fields.Str(required=True)
+    order_ids = fields.List(fields.Int(), validate=validate.Length(min=1, max=5000))
+    from_status = fields.Str()
+    user_id = fields.Int()
+    start_date = fields.DateTime()
+    end_date = fields.DateTime()
+
+class BulkOrderCancelSchema(Schema):
+    """注文一括キャンセル（order_ids かフィルターのどちらかで対象を指定）"""
+    order_ids = fields.List(fields.Int(), validate=validate.Length(min=1, max=5000))
+    user_id = fields.Int()
+    start_date = fields.DateTime()
+    end_date = fields.DateTime()
+    reason = fields.Str()
+
+bulk_order_status_schema = BulkOrderStatusSchema()
+bulk_order_cancel_schema = BulkOrderCancelSchema()
+
 def admin_required():
-    user_id = get_jwt_identity()
-    user = User.find_by_id(user_id)
-    if not user or user.role != 'admin':
-        return False
-    return True
+    # ロールはトークンのクレームで判定（DB 参照なし）
+    return is_admin()
 
 @admin_bp.route('/users', methods=['GET'])
 @jwt_required()
@@ -38,6 +71,88 @@ def get_users():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/students', methods=['GET'])
+@jwt_required()
+def get_students():
+    """生徒一覧取得（タグ表示用の簡易情報）"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        cursor = request.args.get('cursor', type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 200)
+        
+        students_query = User.search(
+            school_id=request.args.get('school_id', type=int),
+            role='student',
+            grade=request.args.get('grade'),
+            class_name=request.args.get('class_name'),
+            keyword=request.args.get('q')
+        ).options(joinedload(User.school).load_only(School.school_name))
+        
+        # OFFSET ではなく user_id のキーセットでページング
+        students, next_cursor = User.keyset_page(students_query, after_id=cursor, limit=per_page)
+        
+        return jsonify({
+            'students': [{
+                'user_id': student.user_id,
+                'student_id': student.student_id,
+                'full_name': student.full_name,
+                'grade': student.grade,
+                'class_name': student.class_name,
+                'school_name': student.school.school_name if student.school else None
+            } for student in students],
+            'per_page': per_page,
+            'next_cursor': next_cursor
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/students/import', methods=['POST'])
+@jwt_required()
+def import_students():
+    """生徒名簿の一括登録（CSV: username,email,password,first_name,last_name[,student_id,grade,class_name]）"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        school_id = request.form.get('school_id', type=int) or request.args.get('school_id', type=int)
+        if not school_id or not School.query.get(school_id):
+            return jsonify({'error': 'School not found'}), 404
+        
+        upload = request.files.get('file')
+        raw = upload.read() if upload else request.get_data()
+        if not raw:
+            return jsonify({'error': 'CSV file is required'}), 400
+        try:
+            text = raw.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return jsonify({'error': 'CSV must be UTF-8 encoded'}), 400
+        
+        reader = csv.DictReader(io.StringIO(text))
+        missing = [field for field in User.ROSTER_REQUIRED_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            return jsonify({'error': f'Missing columns: {", ".join(missing)}'}), 400
+        
+        # 1行目はヘッダーなのでデータは2行目から
+        rows = list(enumerate(reader, start=2))
+        max_rows = current_app.config['ROSTER_IMPORT_MAX_ROWS']
+        if len(rows) > max_rows:
+            return jsonify({'error': f'Too many rows (max {max_rows})'}), 400
+        
+        def log_progress(done, total):
+            current_app.logger.info('Roster import for school %s: %s/%s rows inserted', school_id, done, total)
+        
+        result = User.import_roster(school_id, rows, progress=log_progress)
+        
+        return jsonify({'message': f"{result['imported']} students imported", **result}), 201
+    except PasswordHashBusy:
+        db.session.rollback()
+        return jsonify({'error': 'Password hashing is busy, please retry'}), 503
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/users/<int:user_id>/role', methods=['PUT'])
 @jwt_required()
 def update_user_role(user_id):
@@ -55,8 +170,12 @@ def update_user_role(user_id):
         if new_role not in ['student', 'admin']:
             return jsonify({'error': 'Invalid role'}), 400
         
-        user.role = new_role
-        user.save()
+        # 他ワーカーのキャッシュやトークンのロールクレームが古いまま残らないよう、発行済みトークンも失効させる
+        with unit_of_work():
+            user.role = new_role
+            user.save()
+            token_blocklist.revoke_subject('user', user.user_id)
+        invalidate_principal(user.user_id)
         
         return jsonify({
             'message': 'User role updated successfully',
@@ -82,8 +201,12 @@ def update_user_status(user_id):
         if is_active is None:
             return jsonify({'error': 'is_active field is required'}), 400
         
-        user.is_active = is_active
-        user.save()
+        # 他ワーカーのキャッシュやトークンのロールクレームが古いまま残らないよう、発行済みトークンも失効させる
+        with unit_of_work():
+            user.is_active = is_active
+            user.save()
+            token_blocklist.revoke_subject('user', user.user_id)
+        invalidate_principal(user.user_id)
         
         return jsonify({
             'message': 'User status updated successfully',
@@ -183,6 +306,365 @@ def create_category():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/orders/status', methods=['POST'])
+@jwt_required()
+def bulk_update_order_status():
+    """注文ステータス一括更新（UPDATE ... RETURNING の1文、ID ごとの結果を返す）"""
+    if not admin_required():
+        return jsonify({'error': 'Admin access required'}), 403
+    try:
+        data = bulk_order_status_schema.load(request.get_json() or {})
+    except ValidationError as e:
+        return jsonify({'error': 'Validation failed', 'details': e.messages}), 422
+    
+    filter_keys = ('from_status', 'user_id', 'start_date', 'end_date')
+    if 'order_ids' not in data and not any(key in data for key in filter_keys):
+        return jsonify({'error': 'order_ids or a filter is required'}), 400
+    
+    try:
+        outcomes = Order.bulk_transition(
+            data['status'],
+            order_ids=data.get('order_ids'),
+            from_status=data.get('from_status'),
+            user_id=data.get('user_id'),
+            start_date=data.get('start_date'),
+            end_date=data.get('end_date')
+        )
+        updated_count = sum(1 for outcome in outcomes.values() if outcome == 'updated')
+        return jsonify({
+            'message': f'{updated_count} orders updated',
+            'updated_count': updated_count,
+            'results': [{'order_id': order_id, 'result': outcome} for order_id, outcome in outcomes.items()]
+        }), 200
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/orders/cancel', methods=['POST'])
+@jwt_required()
+def bulk_cancel_orders():
+    """注文一括キャンセル（在庫は教科書ごとに集計して戻す）"""
+    if not admin_required():
+        return jsonify({'error': 'Admin access required'}), 403
+    try:
+        data = bulk_order_cancel_schema.load(request.get_json() or {})
+    except ValidationError as e:
+        return jsonify({'error': 'Validation failed', 'details': e.messages}), 422
+    
+    filter_keys = ('user_id', 'start_date', 'end_date')
+    if 'order_ids' not in data and not any(key in data for key in filter_keys):
+        return jsonify({'error': 'order_ids or a filter is required'}), 400
+    
+    try:
+        outcomes = Order.bulk_cancel(
+            order_ids=data.get('order_ids'),
+            user_id=data.get('user_id'),
+            start_date=data.get('start_date'),
+            end_date=data.get('end_date'),
+            reason=data.get('reason')
+        )
+        cancelled_count = sum(1 for outcome in outcomes.values() if outcome == 'cancelled')
+        return jsonify({
+            'message': f'{cancelled_count} orders cancelled',
+            'cancelled_count': cancelled_count,
+            'results': [{'order_id': order_id, 'result': outcome} for order_id, outcome in outcomes.items()]
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/orders/export', methods=['GET'])
+@jwt_required()
+def export_orders():
+    """注文明細エクスポート（CSV はストリーミング、XLSX はレポートジョブで生成）"""
+    if not admin_required():
+        return jsonify({'error': 'Admin access required'}), 403
+    export_format = request.args.get('format', 'csv')
+    status = request.args.get('status')
+    try:
+        start_date = parse_datetime_arg('start_date')
+        end_date = parse_datetime_arg('end_date')
+    except ValueError:
+        return jsonify({'error': 'start_date and end_date must be ISO 8601 datetimes'}), 400
+    if export_format not in ('csv', 'xlsx'):
+        return jsonify({'error': 'format must be csv or xlsx'}), 400
+    
+    try:
+        if export_format == 'xlsx':
+            # ブック全体の書き出しはワーカーのタイムアウトを超えうるため、ジョブに回して後からダウンロードさせる
+            job = report_jobs.submit({'type': 'orders_xlsx', 'params': {
+                'start_date': start_date.isoformat() if start_date else None,
+                'end_date': end_date.isoformat() if end_date else None,
+                'status': status
+            }})
+            return jsonify({
+                'job': job,
+                'download_url': url_for('.download_orders_export', job_id=job['job_id'])
+            }), 200 if job['status'] == 'done' else 202
+        
+        filename = f"orders_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv"
+        rows = Order.export_lines(start_date=start_date, end_date=end_date, status=status)
+        
+        def generate():
+            # 送信開始後はエラーレスポンスを返せないため、記録して打ち切る
+            try:
+                yield from iter_csv(Order.EXPORT_COLUMNS, rows, bom=True)
+            except Exception:
+                current_app.logger.exception(
+                    'Order export failed mid-stream (start_date=%s, end_date=%s, status=%s)',
+                    start_date, end_date, status
+                )
+                db.session.rollback()
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/csv; charset=utf-8',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/orders/export/<job_id>', methods=['GET'])
+@jwt_required()
+def download_orders_export(job_id):
+    """ジョブで生成した XLSX をダウンロード（未完了なら 202 で状態を返す）"""
+    if not admin_required():
+        return jsonify({'error': 'Admin access required'}), 403
+    job = report_jobs.status(job_id)
+    if job['status'] == 'not_found':
+        return jsonify({'error': 'Export job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'job': job}), 202
+    
+    artifact = report_jobs.artifact_path(job_id)
+    if artifact is None:
+        return jsonify({'error': 'Export file not found'}), 404
+    path, suffix = artifact
+    return send_file(
+        path,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name=f'orders_{job_id[:8]}.{suffix}'
+    )
+
+@admin_bp.route('/reports/jobs', methods=['POST'])
+@jwt_required()
+def submit_report_job():
+    """重いレポートをバックグラウンドで計算（同一指定・同一データならキャッシュを返す）"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No input data provided'}), 400
+        
+        job = report_jobs.submit(data)
+        return jsonify({'job': job}), 200 if job['status'] == 'done' else 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/reports/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_report_job(job_id):
+    """レポートジョブの状態と、完了していれば結果"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        job = report_jobs.status(job_id)
+        if job['status'] == 'not_found':
+            return jsonify({'error': 'Report job not found'}), 404
+        
+        response = {'job': job}
+        if job['status'] == 'done':
+            response['report'] = report_jobs.load_result(job_id)
+        return jsonify(response), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/reports/restock-forecast', methods=['POST'])
+@jwt_required()
+def generate_restock_forecast():
+    """需要予測と推奨発注数の再計算をレポートジョブとして投入（結果は GET で一覧）"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        season_start = data.get('season_start')
+        params = {
+            'season_start': date.fromisoformat(season_start).isoformat() if season_start else None,
+            'season_weeks': int(data.get('season_weeks', current_app.config['RESTOCK_SEASON_WEEKS'])),
+            'history_weeks': current_app.config['RESTOCK_HISTORY_WEEKS']
+        }
+        job = report_jobs.submit({'type': 'restock_forecast', 'params': params})
+        return jsonify({'job': job}), 200 if job['status'] == 'done' else 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/reports/restock-forecast', methods=['GET'])
+@jwt_required()
+def get_restock_forecast():
+    """推奨発注数の一覧（多い順）"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 200)
+        
+        forecasts = RestockForecast.query.options(
+            joinedload(RestockForecast.textbook).load_only(Textbook.id, Textbook.title)
+        ).order_by(
+            RestockForecast.recommended_order.desc(), RestockForecast.textbook_id
+        ).paginate(page=page, per_page=per_page, error_out=False)
+        
+        return jsonify({
+            'forecasts': [forecast.to_dict() for forecast in forecasts.items],
+            'total': forecasts.total,
+            'pages': forecasts.pages,
+            'current_page': page
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/analytics/snapshot', methods=['GET'])
+@jwt_required()
+def get_analytics_snapshot():
+    """現在の分析用スナップショットの情報"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        snapshot = Snapshot(current_app.config['ANALYTICS_DATA_DIR'])
+        return jsonify({'snapshot': snapshot.meta}), 200
+    except FileNotFoundError:
+        return jsonify({'error': 'No analytics snapshot has been created yet'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/analytics/aggregate', methods=['GET'])
+@jwt_required()
+def aggregate_analytics():
+    """スナップショットの列を集計（本番 DB には問い合わせない）"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        start_day = request.args.get('start_day')
+        end_day = request.args.get('end_day')
+        snapshot = Snapshot(current_app.config['ANALYTICS_DATA_DIR'])
+        
+        rows = snapshot.aggregate(
+            request.args.get('table', 'order_items'),
+            metric=request.args.get('metric', 'count'),
+            group_by=request.args.get('group_by'),
+            start_day=date.fromisoformat(start_day) if start_day else None,
+            end_day=date.fromisoformat(end_day) if end_day else None,
+            status=request.args.get('status'),
+            limit=min(request.args.get('limit', 100, type=int), 1000)
+        )
+        
+        return jsonify({
+            'snapshot_id': snapshot.meta['snapshot_id'],
+            'rows': rows
+        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError:
+        return jsonify({'error': 'No analytics snapshot has been created yet'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _json_rows(query):
+    """サブクエリの行を JSON 配列にまとめたスカラーサブクエリ（0件なら []）"""
+    rows = query.subquery()
+    return db.select(
+        db.func.coalesce(db.func.json_agg(rows.table_valued()), db.text("'[]'::json"))
+    ).select_from(rows).scalar_subquery()
+
+def build_dashboard_stats():
+    """ダッシュボード統計情報を1回の SELECT で集計（件数はスカラーサブクエリ、在庫アラートと最近の注文は json_agg）"""
+    count_all = db.func.count()
+    alert_columns = (Textbook.id, Textbook.title, Textbook.price, Textbook.stock_quantity,
+                     Textbook.category_id, Textbook.school_id)
+    low_stock = Textbook.low_stock_query().filter(Textbook.stock_quantity > 0).with_entities(*alert_columns).limit(5)
+    out_of_stock = Textbook.low_stock_query(0).with_entities(*alert_columns).limit(5)
+    recent_orders = Order.query.with_entities(
+        Order.id, Order.user_id, Order.order_date, Order.total_amount, Order.status, Order.shipping_address,
+        Order.payment_method, Order.payment_status, Order.created_at, Order.updated_at
+    ).order_by(Order.created_at.desc(), Order.id.desc()).limit(5)
+    row = db.session.query(
+        db.session.query(count_all).select_from(School).scalar_subquery().label('total_schools'),
+        db.session.query(count_all).select_from(User).filter(
+            User.role == 'student', User.is_active == True
+        ).scalar_subquery().label('total_students'),
+        db.session.query(count_all).select_from(Textbook).scalar_subquery().label('total_textbooks'),
+        db.session.query(count_all).select_from(Order).scalar_subquery().label('total_orders'),
+        db.session.query(count_all.filter(Order.status == 'pending')).select_from(Order).scalar_subquery().label('pending_orders'),
+        *Textbook.stock_alert_counts(),
+        _json_rows(low_stock).label('low_stock_items'),
+        _json_rows(out_of_stock).label('out_of_stock_items'),
+        _json_rows(recent_orders).label('recent_orders')
+    ).one()
+    
+    return {
+        'stats': {
+            'total_schools': row.total_schools,
+            'total_students': row.total_students,
+            'total_textbooks': row.total_textbooks,
+            'total_orders': row.total_orders,
+            'pending_orders': row.pending_orders
+        },
+        'inventory_alerts': {
+            'low_stock_count': row.low_stock_count,
+            'out_of_stock_count': row.out_of_stock_count,
+            'low_stock_items': row.low_stock_items,
+            'out_of_stock_items': row.out_of_stock_items
+        },
+        'recent_orders': row.recent_orders,
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
+@admin_bp.route('/dashboard', methods=['GET'])
+@jwt_required()
+def get_dashboard_stats():
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        # 短い TTL でキャッシュ（期限切れ直後は古い値を返して裏で再計算）
+        dashboard = cache.get_or_compute(
+            'admin_dashboard',
+            build_dashboard_stats,
+            ttl=current_app.config['DASHBOARD_CACHE_TTL'],
+            stale_ttl=current_app.config['DASHBOARD_CACHE_STALE_TTL']
+        )
+        return jsonify(dashboard), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/metrics/db-pool', methods=['GET'])
+@jwt_required()
+def db_pool_metrics():
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        # 応答したワーカープロセスのプールのみ（pid で区別）
+        return jsonify(pool_status(db.engine)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/reports/sales', methods=['GET'])
 @jwt_required()
 def sales_report():
@@ -191,38 +673,99 @@ def sales_report():
             return jsonify({'error': 'Admin access required'}), 403
         
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
+        bucket = request.args.get('bucket')
+        breakdown = request.args.get('breakdown')
+        start_day = (datetime.utcnow() - timedelta(days=days)).date()
+        
+        # 日次ロールアップから集計（注文件数ではなく日数に比例）
+        report = {'period_days': days}
+        report.update(Order.sales_totals(start_day))
+        if bucket:
+            try:
+                report['bucket'] = bucket
+                report['breakdown'] = breakdown
+                report['series'] = Order.sales_series(start_day, bucket=bucket, breakdown=breakdown)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        return jsonify(report), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/reports/inventory', methods=['GET'])
+@jwt_required()
+def inventory_report():
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
         
-        orders = Order.query.filter(Order.created_at >= start_date).all()
+        low_stock_threshold = request.args.get('threshold', Textbook.LOW_STOCK_THRESHOLD, type=int)
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 200)
         
-        total_sales = sum(order.total_amount for order in orders)
-        total_orders = len(orders)
+        # 件数は COUNT、明細は在庫の少ない順にページング
+        low_stock_items = Textbook.low_stock_query(low_stock_threshold).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
         
         return jsonify({
-            'period_days': days,
-            'total_sales': total_sales,
-            'total_orders': total_orders,
-            'average_order_value': total_sales / total_orders if total_orders > 0 else 0
+            'total_textbooks': db.session.query(db.func.count(Textbook.id)).scalar(),
+            'low_stock_items': [tb.to_dict() for tb in low_stock_items.items],
+            'low_stock_count': low_stock_items.total,
+            'pages': low_stock_items.pages,
+            'current_page': page
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@admin_bp.route('/reports/inventory', methods=['GET'])
+@admin_bp.route('/reports/inventory/<int:textbook_id>/movements', methods=['GET'])
 @jwt_required()
-def inventory_report():
+def stock_movements(textbook_id):
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        try:
+            start = parse_datetime_arg('start')
+            end = parse_datetime_arg('end')
+        except ValueError:
+            return jsonify({'error': 'start and end must be ISO 8601 datetimes'}), 400
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        before_id = request.args.get('before_id', type=int)
+        
+        movements = StockMovement.history(textbook_id, start=start, end=end, limit=limit, before_id=before_id)
+        
+        return jsonify({
+            'textbook_id': textbook_id,
+            'movements': [movement.to_dict() for movement in movements],
+            'next_before_id': movements[-1].id if len(movements) == limit else None
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/reports/inventory/<int:textbook_id>/stock-at', methods=['GET'])
+@jwt_required()
+def stock_at(textbook_id):
     try:
         if not admin_required():
             return jsonify({'error': 'Admin access required'}), 403
         
-        low_stock_threshold = request.args.get('threshold', 10, type=int)
+        try:
+            at = parse_datetime_arg('at') or datetime.utcnow()
+        except ValueError:
+            return jsonify({'error': 'at must be an ISO 8601 datetime'}), 400
         
-        textbooks = Textbook.query.all()
-        low_stock_items = [tb for tb in textbooks if tb.stock_quantity <= low_stock_threshold]
+        try:
+            quantity = StockMovement.stock_at(textbook_id, at)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if quantity is None:
+            return jsonify({'error': 'Textbook not found'}), 404
         
         return jsonify({
-            'total_textbooks': len(textbooks),
-            'low_stock_items': [tb.to_dict() for tb in low_stock_items],
-            'low_stock_count': len(low_stock_items)
+            'textbook_id': textbook_id,
+            'at': at.isoformat(),
+            'stock_quantity': quantity
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
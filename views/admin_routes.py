@@ -1,6 +1,5 @@
 from flask import Blueprint, request
-from flask_jwt_extended import jwt_required
-from marshmallow import Schema, fields, validates, ValidationError
+from marshmallow import Schema, fields, ValidationError
 
 from models import db
 from models.school import School
@@ -9,7 +8,11 @@ from models.user import User
 from models.textbook import Textbook
 from models.category import Category
 from models.order import Order
+from models.stock_movement import StockMovement
+from models.base_model import unit_of_work
 from utils.auth import admin_required, create_error_response, create_success_response
+from utils.params import parse_datetime_arg, parse_include_arg
+from utils.passwords import PasswordHashBusy
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -95,7 +98,7 @@ def create_school(current_user):
         
     except ValidationError as e:
         return create_error_response('VALIDATION_ERROR', 'Validation failed', e.messages, 422)
-    except Exception as e:
+    except Exception:
         return create_error_response('INVALID_INPUT', 'Invalid input data')
     
     try:
@@ -108,14 +111,15 @@ def create_school(current_user):
             phone=data.get('phone'),
             email=data.get('email')
         )
-        school.save()
-        
-        # 学校の認証情報作成
-        school_auth = SchoolAuth.create_for_school(
-            school.school_id,
-            data['login_id'],
-            data['password']
-        )
+        # 学校と認証情報を1回のコミットで作成
+        with unit_of_work():
+            school.save()
+            db.session.flush()
+            school_auth = SchoolAuth.create_for_school(
+                school.school_id,
+                data['login_id'],
+                data['password']
+            )
         
         school_data = school.to_dict()
         school_data['login_id'] = school_auth.login_id
@@ -125,6 +129,9 @@ def create_school(current_user):
             'school': school_data
         }, status_code=201)
         
+    except PasswordHashBusy:
+        db.session.rollback()
+        return create_error_response('SERVER_BUSY', 'Password hashing is busy, please retry', status_code=503)
     except Exception as e:
         db.session.rollback()
         return create_error_response('CREATE_FAILED', f'Failed to create school: {str(e)}', status_code=500)
@@ -163,7 +170,7 @@ def update_school(current_user, school_id):
         
     except ValidationError as e:
         return create_error_response('VALIDATION_ERROR', 'Validation failed', e.messages, 422)
-    except Exception as e:
+    except Exception:
         return create_error_response('INVALID_INPUT', 'Invalid input data')
     
     try:
@@ -216,48 +223,6 @@ def delete_school(current_user, school_id):
 
 # ==================== 生徒管理（タグ表示用） ====================
 
-@admin_bp.route('/students', methods=['GET'])
-@admin_required
-def get_students(current_user):
-    """生徒一覧取得（タグ表示用の簡易情報）"""
-    try:
-        school_id = request.args.get('school_id', type=int)
-        grade = request.args.get('grade')
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-        
-        students_query = User.search(school_id=school_id, role='student')
-        
-        if grade:
-            students_query = students_query.filter_by(grade=grade)
-        
-        pagination = students_query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
-        
-        # タグ表示用の簡易データ
-        students_data = [{
-            'user_id': student.user_id,
-            'student_id': student.student_id,
-            'full_name': student.full_name,
-            'grade': student.grade,
-            'class_name': student.class_name,
-            'school_name': student.school.school_name if student.school else None
-        } for student in pagination.items]
-        
-        return create_success_response({
-            'students': students_data,
-            'total': pagination.total,
-            'page': page,
-            'per_page': per_page,
-            'pages': pagination.pages
-        })
-        
-    except Exception as e:
-        return create_error_response('FETCH_FAILED', f'Failed to fetch students: {str(e)}', status_code=500)
-
 @admin_bp.route('/students/<int:student_id>', methods=['GET'])
 @admin_required
 def get_student_detail(current_user, student_id):
@@ -331,7 +296,7 @@ def create_textbook(current_user):
         
     except ValidationError as e:
         return create_error_response('VALIDATION_ERROR', 'Validation failed', e.messages, 422)
-    except Exception as e:
+    except Exception:
         return create_error_response('INVALID_INPUT', 'Invalid input data')
     
     try:
@@ -371,13 +336,20 @@ def update_textbook(current_user, textbook_id):
         if not textbook:
             return create_error_response('TEXTBOOK_NOT_FOUND', 'Textbook not found', status_code=404)
         
+        old_stock = textbook.stock_quantity or 0
+        
         # 更新
         allowed_fields = ['category_id', 'title', 'price', 'stock_quantity', 'grade_level', 'subject', 'image_url', 'is_active']
         for key, value in json_data.items():
             if key in allowed_fields and hasattr(textbook, key):
                 setattr(textbook, key, value)
         
-        textbook.save()
+        # 在庫の手動調整を台帳に記録（更新と同じコミットで）
+        with unit_of_work():
+            StockMovement.record_many([StockMovement.build(
+                textbook.id, (textbook.stock_quantity or 0) - old_stock, 'adjust', note=f'admin:{current_user.user_id}'
+            )])
+            textbook.save()
         
         textbook_data = textbook.to_dict()
         
@@ -421,9 +393,21 @@ def get_all_orders(current_user):
         school_id = request.args.get('school_id', type=int)
         status = request.args.get('status')
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        orders_query = Order.search(user_id=school_id, status=status)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        include_items = 'items' in parse_include_arg()
+        try:
+            start_date = parse_datetime_arg('start_date')
+            end_date = parse_datetime_arg('end_date')
+        except ValueError:
+            return create_error_response('INVALID_INPUT', 'start_date and end_date must be ISO 8601 datetimes')
+        
+        orders_query = Order.search(
+            user_id=school_id,
+            status=status,
+            start_date=start_date,
+            end_date=end_date,
+            include_items=include_items
+        )
         
         pagination = orders_query.paginate(
             page=page,
@@ -431,7 +415,10 @@ def get_all_orders(current_user):
             error_out=False
         )
         
-        orders_data = [order.to_dict() for order in pagination.items]
+        if include_items:
+            orders_data = [order.to_dict_with_items() for order in pagination.items]
+        else:
+            orders_data = [order.to_dict() for order in pagination.items]
         
         return create_success_response({
             'orders': orders_data,
@@ -449,7 +436,7 @@ def get_all_orders(current_user):
 def get_order_detail(current_user, order_id):
     """注文詳細取得"""
     try:
-        order = Order.query.get(order_id)
+        order = Order.query.options(Order.items_loader()).get(order_id)
         
         if not order:
             return create_error_response('ORDER_NOT_FOUND', 'Order not found', status_code=404)
@@ -529,47 +516,3 @@ def create_category(current_user):
     except Exception as e:
         db.session.rollback()
         return create_error_response('CREATE_FAILED', f'Failed to create category: {str(e)}', status_code=500)
-
-# ==================== ダッシュボード ====================
-
-@admin_bp.route('/dashboard', methods=['GET'])
-@admin_required
-def get_dashboard_stats(current_user):
-    """ダッシュボード統計情報"""
-    try:
-        # 統計情報収集
-        total_schools = School.query.filter_by(is_active=True).count()
-        total_students = User.query.filter_by(role='student', is_active=True).count()
-        total_textbooks = Textbook.query.filter_by(is_active=True).count()
-        
-        # 注文統計
-        total_orders = Order.query.count()
-        pending_orders = Order.query.filter_by(status='pending').count()
-        
-        # 在庫アラート
-        low_stock = Textbook.get_low_stock_textbooks()
-        out_of_stock = Textbook.get_out_of_stock_textbooks()
-        
-        # 最近の注文
-        recent_orders = Order.query.order_by(Order.ordered_at.desc()).limit(5).all()
-        recent_orders_data = [order.to_dict() for order in recent_orders]
-        
-        return create_success_response({
-            'stats': {
-                'total_schools': total_schools,
-                'total_students': total_students,
-                'total_textbooks': total_textbooks,
-                'total_orders': total_orders,
-                'pending_orders': pending_orders
-            },
-            'inventory_alerts': {
-                'low_stock_count': len(low_stock),
-                'out_of_stock_count': len(out_of_stock),
-                'low_stock_items': [tb.to_dict() for tb in low_stock[:5]],
-                'out_of_stock_items': [tb.to_dict() for tb in out_of_stock[:5]]
-            },
-            'recent_orders': recent_orders_data
-        })
-        
-    except Exception as e:
-        return create_error_response('FETCH_FAILED', f'Failed to fetch dashboard stats: {str(e)}', status_code=500)
\ No newline at end of file
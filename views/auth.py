@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt, create_access_token, create_refresh_token
 from models.user import User
 from extensions import db
+from utils.passwords import PasswordHashBusy, reject_unknown_account
+from utils.auth import user_claims
+from utils.rate_limit import check_login_rate
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/v1/auth")
 
@@ -21,7 +25,10 @@ def register():
         return jsonify({"message": "Email already exists"}), 409
 
     new_user = User(username=username, email=email, school_id=school_id)
-    new_user.set_password(password)
+    try:
+        new_user.set_password(password)
+    except PasswordHashBusy:
+        return jsonify({"message": "Server is busy, please retry"}), 503
     db.session.add(new_user)
     db.session.commit()
 
@@ -29,10 +36,44 @@ def register():
 
 @auth_bp.route("/login", methods=["POST"])
 def login():
-    # ログインロジックをここに追加
-    return jsonify({"message": "Login endpoint not implemented yet"}), 501
+    data = request.get_json() or {}
+    email = data.get("email")
+    password = data.get("password")
+
+    if not email or not password:
+        return jsonify({"message": "Missing email or password"}), 400
+
+    # パスワード照合の前に試行回数を制限
+    retry_after = check_login_rate(email)
+    if retry_after:
+        return jsonify({"message": "Too many login attempts, please retry later"}), 429, {"Retry-After": str(retry_after)}
+
+    user = User.find_by_email(email)
+    try:
+        if not user:
+            reject_unknown_account(password)
+            return jsonify({"message": "Invalid email or password"}), 401
+        if not user.check_password(password):
+            return jsonify({"message": "Invalid email or password"}), 401
+    except PasswordHashBusy:
+        return jsonify({"message": "Server is busy, please retry"}), 503
+    if not user.is_active:
+        return jsonify({"message": "Account is inactive"}), 401
+
+    # ロールと学校をクレームに入れ、以降の権限判定で DB を引かない
+    access_token = create_access_token(identity=user.user_id, additional_claims=user_claims(user))
+    refresh_token = create_refresh_token(identity=user.user_id, additional_claims={'type': 'user'})
+
+    return jsonify({
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "user": user.to_dict()
+    }), 200
 
 @auth_bp.route("/logout", methods=["POST"])
+@jwt_required()
 def logout():
-    # ログアウトロジックをここに追加
-    return jsonify({"message": "Logout endpoint not implemented yet"}), 501
+    # 現在のトークンを exp まで失効リストに登録
+    from utils.token_blocklist import token_blocklist
+    token_blocklist.revoke(get_jwt())
+    return jsonify({"message": "Successfully logged out"}), 200
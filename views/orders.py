@@ -1,19 +1,54 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError
+from utils.auth import is_admin
 from models.order import Order, OrderItem
 from models.cart import Cart
 from models.textbook import Textbook
-from models.user import User
+from models.stock_movement import StockMovement
+from models.sales_rollup import DailySales
+from models.base_model import unit_of_work
 from extensions import db
+from utils.params import parse_datetime_arg, parse_include_arg
 
 orders_bp = Blueprint('orders', __name__)
 
+class CartOperationSchema(Schema):
+    """カート一括操作の1件分"""
+    op = fields.Str(required=True, validate=validate.OneOf(Cart.OPERATIONS))
+    textbook_id = fields.Int(required=True)
+    quantity = fields.Int(validate=validate.Range(min=0))
+
+    @validates_schema
+    def validate_quantity(self, data, **kwargs):
+        if data['op'] == 'add' and data.get('quantity', 1) < 1:
+            raise ValidationError('quantity must be at least 1 for add', 'quantity')
+        if data['op'] == 'set' and 'quantity' not in data:
+            raise ValidationError('quantity is required for set', 'quantity')
+
+class BatchCartSchema(Schema):
+    """カート一括操作用スキーマ"""
+    operations = fields.List(
+        fields.Nested(CartOperationSchema),
+        required=True,
+        validate=validate.Length(min=1, max=100)
+    )
+
+class BulkCancelSchema(Schema):
+    """自分の注文の一括キャンセル"""
+    order_ids = fields.List(fields.Int(), required=True, validate=validate.Length(min=1, max=1000))
+    reason = fields.Str()
+
+batch_cart_schema = BatchCartSchema()
+bulk_cancel_schema = BulkCancelSchema()
+
 @orders_bp.route('/cart', methods=['GET'])
 @jwt_required()
 def get_cart():
     try:
         user_id = get_jwt_identity()
-        cart_items = Cart.query.filter_by(user_id=user_id).all()
+        # 教科書を JOIN で同時に読み、to_dict での行ごとの遅延ロードを避ける
+        cart_items = Cart.get_user_cart(user_id)
         return jsonify([item.to_dict() for item in cart_items]), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -33,25 +68,39 @@ def add_to_cart():
             return jsonify({'error': 'Textbook not found'}), 404
         if textbook.stock_quantity < quantity:
             return jsonify({'error': 'Insufficient stock'}), 400
-        existing_cart_item = Cart.query.filter_by(user_id=user_id, textbook_id=textbook_id).first()
-        if existing_cart_item:
-            existing_cart_item.quantity += quantity
-            existing_cart_item.save()
-            cart_item = existing_cart_item
-        else:
-            cart_item = Cart(user_id=user_id, textbook_id=textbook_id, quantity=quantity)
-            cart_item.save()
+        cart_item = Cart.add_item(user_id, textbook_id, quantity)
         return jsonify({'message': 'Item added to cart successfully', 'cart_item': cart_item.to_dict()}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@orders_bp.route('/cart', methods=['PATCH'])
+@jwt_required()
+def batch_update_cart():
+    """カート一括操作（add/set/remove を1トランザクションで反映）"""
+    try:
+        data = batch_cart_schema.load(request.get_json() or {})
+    except ValidationError as e:
+        return jsonify({'error': 'Validation failed', 'details': e.messages}), 422
+    try:
+        user_id = get_jwt_identity()
+        cart_items = Cart.apply_operations(user_id, data['operations'])
+        summary = Cart.summarize(cart_items)
+        summary['message'] = 'Cart updated'
+        return jsonify(summary), 200
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @orders_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_order():
     try:
         user_id = get_jwt_identity()
         data = request.get_json()
-        cart_items = Cart.query.filter_by(user_id=user_id).all()
+        cart_items = Cart.get_user_cart(user_id)
         if not cart_items:
             return jsonify({'error': 'Cart is empty'}), 400
         total_amount = 0
@@ -75,22 +124,29 @@ def create_order():
             payment_method=data.get('payment_method', 'cash_on_delivery'),
             status='pending'
         )
-        order.save()
-        for item_data in order_items_data:
-            order_item = OrderItem(
-                order_id=order.id,
-                textbook_id=item_data['textbook_id'],
-                quantity=item_data['quantity'],
-                unit_price=item_data['unit_price'],
-                total_price=item_data['total_price']
-            )
-            order_item.save()
-            textbook = Textbook.query.get(item_data['textbook_id'])
-            textbook.stock_quantity -= item_data['quantity']
-            textbook.save()
-        Cart.query.filter_by(user_id=user_id).delete()
-        db.session.commit()
+        # 注文・明細・在庫・台帳・日次売上・カート削除を1回のコミットで
+        with unit_of_work():
+            order.save()
+            db.session.flush()
+            movements = []
+            short = Textbook.decrement_stock({item['textbook_id']: item['quantity'] for item in order_items_data})
+            if short:
+                titles = {cart_item.textbook_id: cart_item.textbook.title for cart_item in cart_items}
+                raise ValueError(f'Insufficient stock for {titles[short[0]]}')
+            for item_data in order_items_data:
+                item_data['order_id'] = order.id
+                movements.append(StockMovement.build(
+                    item_data['textbook_id'], -item_data['quantity'], 'order', order_id=order.id
+                ))
+            OrderItem.bulk_save(order_items_data)
+            StockMovement.record_many(movements)
+            db.session.flush()
+            DailySales.record_orders([order.id])
+            Cart.bulk_delete(Cart.user_id == user_id)
         return jsonify({'message': 'Order created successfully', 'order': order.to_dict()}), 201
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -100,11 +156,68 @@ def create_order():
 def get_orders():
     try:
         user_id = get_jwt_identity()
-        user = User.find_by_id(user_id)
-        if user.role == 'admin':
-            orders = Order.query.all()
-        else:
-            orders = Order.query.filter_by(user_id=user_id).all()
-        return jsonify([order.to_dict() for order in orders]), 200
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        status = request.args.get('status')
+        include_items = 'items' in parse_include_arg()
+        try:
+            start_date = parse_datetime_arg('start_date')
+            end_date = parse_datetime_arg('end_date')
+        except ValueError:
+            return jsonify({'error': 'start_date and end_date must be ISO 8601 datetimes'}), 400
+        
+        orders_query = Order.search(
+            user_id=None if is_admin() else user_id,
+            status=status,
+            start_date=start_date,
+            end_date=end_date,
+            include_items=include_items
+        )
+        orders = orders_query.paginate(page=page, per_page=per_page, error_out=False)
+        
+        return jsonify({
+            'orders': [order.to_dict_with_items() if include_items else order.to_dict() for order in orders.items],
+            'total': orders.total,
+            'pages': orders.pages,
+            'current_page': page
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@orders_bp.route('/<int:order_id>', methods=['GET'])
+@jwt_required()
+def get_order(order_id):
+    try:
+        user_id = get_jwt_identity()
+        order = Order.query.options(Order.items_loader()).get(order_id)
+        if not order:
+            return jsonify({'error': 'Order not found'}), 404
+        if not is_admin() and order.user_id != user_id:
+            return jsonify({'error': 'Access denied'}), 403
+        return jsonify(order.to_dict_with_items()), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@orders_bp.route('/cancel', methods=['POST'])
+@jwt_required()
+def bulk_cancel_orders():
+    """自分の注文の一括キャンセル（他人の注文は user_id 条件で対象外になり not_found になる）"""
+    try:
+        data = bulk_cancel_schema.load(request.get_json() or {})
+    except ValidationError as e:
+        return jsonify({'error': 'Validation failed', 'details': e.messages}), 422
+    try:
+        outcomes = Order.bulk_cancel(
+            order_ids=data['order_ids'],
+            user_id=get_jwt_identity(),
+            reason=data.get('reason')
+        )
+        cancelled_count = sum(1 for outcome in outcomes.values() if outcome == 'cancelled')
+        return jsonify({
+            'message': f'{cancelled_count} orders cancelled',
+            'cancelled_count': cancelled_count,
+            'results': [{'order_id': order_id, 'result': outcome} for order_id, outcome in outcomes.items()]
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
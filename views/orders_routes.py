@@ -7,6 +7,7 @@ from models.cart import Cart
 from models.order import Order
 from models.school import School
 from utils.auth import create_error_response, create_success_response
+from utils.params import parse_datetime_arg, parse_include_arg
 
 orders_bp = Blueprint('orders', __name__)
 
@@ -172,10 +173,22 @@ def get_orders():
         # クエリパラメータ
         status = request.args.get('status')
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        include_items = 'items' in parse_include_arg()
+        try:
+            start_date = parse_datetime_arg('start_date')
+            end_date = parse_datetime_arg('end_date')
+        except ValueError:
+            return create_error_response('INVALID_INPUT', 'start_date and end_date must be ISO 8601 datetimes')
         
         # 注文検索
-        orders_query = Order.search(user_id=school_id, status=status)
+        orders_query = Order.search(
+            user_id=school_id,
+            status=status,
+            start_date=start_date,
+            end_date=end_date,
+            include_items=include_items
+        )
         
         # ページネーション
         pagination = orders_query.paginate(
@@ -184,7 +197,10 @@ def get_orders():
             error_out=False
         )
         
-        orders_data = [order.to_dict() for order in pagination.items]
+        if include_items:
+            orders_data = [order.to_dict_with_items() for order in pagination.items]
+        else:
+            orders_data = [order.to_dict() for order in pagination.items]
         
         return create_success_response({
             'orders': orders_data,
@@ -204,7 +220,7 @@ def get_order(order_id):
     try:
         school_id = get_jwt_identity()
         
-        order = Order.query.get(order_id)
+        order = Order.query.options(Order.items_loader()).get(order_id)
         
         if not order:
             return create_error_response('ORDER_NOT_FOUND', 'Order not found', status_code=404)
@@ -285,4 +301,4 @@ def cancel_order(order_id):
         return create_error_response('CANCEL_ERROR', str(e), status_code=400)
     except Exception as e:
         db.session.rollback()
-        return create_error_response('CANCEL_FAILED', f'Failed to cancel order: {str(e)}', status_code=500)
\ No newline at end of file
+        return create_error_response('CANCEL_FAILED', f'Failed to cancel order: {str(e)}', status_code=500)
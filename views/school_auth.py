@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from utils.auth import is_admin
 from models.school_auth import SchoolAuth
 from models.school import School
-from models.user import User
 from extensions import db
+from models.base_model import unit_of_work
+from utils.passwords import PasswordHashBusy
 
 school_auth_bp = Blueprint('school_auth', __name__)
 
@@ -44,9 +46,7 @@ def register_school():
 @jwt_required()
 def get_school_requests():
     try:
-        user_id = get_jwt_identity()
-        user = User.find_by_id(user_id)
-        if not user or user.role != 'admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         status = request.args.get('status', 'pending')
@@ -61,8 +61,7 @@ def get_school_requests():
 def approve_school_request(request_id):
     try:
         user_id = get_jwt_identity()
-        user = User.find_by_id(user_id)
-        if not user or user.role != 'admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         school_request = SchoolAuth.query.get(request_id)
@@ -72,25 +71,29 @@ def approve_school_request(request_id):
         if school_request.status != 'pending':
             return jsonify({'error': 'Request already processed'}), 400
         
-        school = School(
-            school_name=school_request.school_name,
-            prefecture=school_request.prefecture,
-            city=school_request.city,
-            address=school_request.address,
-            phone=school_request.contact_phone,
-            email=school_request.contact_email
-        )
-        school.save()
-        
-        school_request.status = 'approved'
-        school_request.approved_by = user_id
-        school_request.approved_at = db.func.now()
-        school_request.save()
+        # 学校作成と申請の承認を1回のコミットで
+        with unit_of_work():
+            school = School(
+                school_name=school_request.school_name,
+                prefecture=school_request.prefecture,
+                city=school_request.city,
+                address=school_request.address,
+                phone=school_request.contact_phone,
+                email=school_request.contact_email
+            )
+            school.save()
+            
+            school_request.status = 'approved'
+            school_request.approved_by = user_id
+            school_request.approved_at = db.func.now()
+            school_request.save()
         
         return jsonify({
             'message': 'School request approved successfully',
             'school': school.to_dict()
         }), 200
+    except PasswordHashBusy:
+        return jsonify({'error': 'Server is busy, please retry'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -99,8 +102,7 @@ def approve_school_request(request_id):
 def reject_school_request(request_id):
     try:
         user_id = get_jwt_identity()
-        user = User.find_by_id(user_id)
-        if not user or user.role != 'admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         school_request = SchoolAuth.query.get(request_id)
@@ -7,6 +7,8 @@ from models import db
 from models.school import School
 from models.school_auth import SchoolAuth
 from utils.auth import create_error_response, create_success_response
+from utils.passwords import PasswordHashBusy
+from utils.rate_limit import check_login_rate
 
 school_auth_bp = Blueprint('school_auth', __name__)
 
@@ -33,6 +35,15 @@ def school_login():
     except Exception as e:
         return create_error_response('INVALID_INPUT', 'Invalid input data')
     
+    # パスワード照合の前に試行回数を制限
+    retry_after = check_login_rate(data['login_id'])
+    if retry_after:
+        response, status = create_error_response(
+            'TOO_MANY_ATTEMPTS', 'Too many login attempts, please retry later', status_code=429
+        )
+        response.headers['Retry-After'] = str(retry_after)
+        return response, status
+    
     try:
         # 学校認証情報を検索
         school_auth = SchoolAuth.find_by_login_id(data['login_id'])
@@ -50,7 +61,7 @@ def school_login():
             identity=school_auth.school_id,
             additional_claims={'type': 'school', 'auth_id': school_auth.auth_id}
         )
-        refresh_token = create_refresh_token(identity=school_auth.school_id)
+        refresh_token = create_refresh_token(identity=school_auth.school_id, additional_claims={'type': 'school'})
         
         # レスポンスデータ
         school_data = {
@@ -68,6 +79,8 @@ def school_login():
             'refresh_token': refresh_token
         })
         
+    except PasswordHashBusy:
+        return create_error_response('SERVER_BUSY', 'Too many login attempts in progress, please retry', status_code=503)
     except Exception as e:
         return create_error_response('LOGIN_FAILED', f'Login failed: {str(e)}', status_code=500)
 
@@ -1,10 +1,15 @@
-from flask import Blueprint, request, jsonify
+import re
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from utils.auth import is_admin
 from models.textbook import Textbook
-from models.user import User
 from models.category import Category
 from models.school import School
+from models.stock_movement import StockMovement
+from models.sales_rollup import DailySales
+from models.base_model import unit_of_work
 from extensions import db
+from utils.cache import cache
 
 textbooks_bp = Blueprint('textbooks', __name__)
 
@@ -16,6 +21,7 @@ def get_textbooks():
         category_id = request.args.get('category_id', type=int)
         school_id = request.args.get('school_id', type=int)
         search = request.args.get('search', '')
+        sort = request.args.get('sort')
         
         query = Textbook.query
         
@@ -25,6 +31,12 @@ def get_textbooks():
             query = query.filter(Textbook.school_id == school_id)
         if search:
             query = query.filter(Textbook.title.contains(search))
+        if sort == 'popular':
+            # 直近30日の販売冊数（日次ロールアップ）で並べ替え
+            popularity = DailySales.popularity_subquery(days=30)
+            query = query.outerjoin(popularity, popularity.c.textbook_id == Textbook.id).order_by(
+                db.func.coalesce(popularity.c.units, 0).desc(), Textbook.id
+            )
         
         textbooks = query.paginate(page=page, per_page=per_page, error_out=False)
         
@@ -37,6 +49,58 @@ def get_textbooks():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+RANKING_WINDOWS = (7, 30, 365)
+RANKING_MAX_LIMIT = 100
+# users.grade は String(10)。キャッシュキーに入るので形式を絞る
+GRADE_PATTERN = re.compile(r'^\w{1,10}$')
+
+@textbooks_bp.route('/rankings', methods=['GET'])
+@jwt_required()
+def get_rankings():
+    try:
+        days = request.args.get('window', 30, type=int)
+        school_id = request.args.get('school_id', type=int)
+        category_id = request.args.get('category_id', type=int)
+        grade = request.args.get('grade')
+        limit = min(request.args.get('limit', 10, type=int), RANKING_MAX_LIMIT)
+        
+        if days not in RANKING_WINDOWS:
+            return jsonify({'error': f'window must be one of {", ".join(map(str, RANKING_WINDOWS))}'}), 400
+        if limit < 1:
+            return jsonify({'error': f'limit must be between 1 and {RANKING_MAX_LIMIT}'}), 400
+        if grade is not None and not GRADE_PATTERN.match(grade):
+            return jsonify({'error': 'grade must be 1-10 letters or digits'}), 400
+        
+        def build_ranking():
+            ranking = DailySales.top_textbooks(
+                days=days, school_id=school_id, category_id=category_id, grade=grade, limit=limit
+            )
+            titles = dict(db.session.query(Textbook.id, Textbook.title).filter(
+                Textbook.id.in_([row['textbook_id'] for row in ranking])
+            ).all()) if ranking else {}
+            for rank, row in enumerate(ranking, 1):
+                row['rank'] = rank
+                row['title'] = titles.get(row['textbook_id'])
+            return ranking
+        
+        cache_key = f'rankings:{days}:{school_id}:{category_id}:{grade}:{limit}'
+        ranking = cache.get_or_compute(
+            cache_key,
+            build_ranking,
+            ttl=current_app.config['RANKING_CACHE_TTL'],
+            stale_ttl=current_app.config['RANKING_CACHE_TTL']
+        )
+        
+        return jsonify({
+            'window_days': days,
+            'school_id': school_id,
+            'category_id': category_id,
+            'grade': grade,
+            'rankings': ranking
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @textbooks_bp.route('/<int:textbook_id>', methods=['GET'])
 def get_textbook(textbook_id):
     try:
@@ -51,9 +115,7 @@ def get_textbook(textbook_id):
 @jwt_required()
 def create_textbook():
     try:
-        user_id = get_jwt_identity()
-        user = User.find_by_id(user_id)
-        if not user or user.role != 'admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         data = request.get_json()
@@ -87,8 +149,7 @@ def create_textbook():
 def update_textbook(textbook_id):
     try:
         user_id = get_jwt_identity()
-        user = User.find_by_id(user_id)
-        if not user or user.role != 'admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         textbook = Textbook.query.get(textbook_id)
@@ -96,12 +157,18 @@ def update_textbook(textbook_id):
             return jsonify({'error': 'Textbook not found'}), 404
         
         data = request.get_json()
+        old_stock = textbook.stock_quantity or 0
         updatable_fields = ['title', 'author', 'isbn', 'price', 'stock_quantity', 'description', 'image_url', 'category_id', 'school_id']
         for field in updatable_fields:
             if field in data:
                 setattr(textbook, field, data[field])
         
-        textbook.save()
+        # 在庫の手動調整を台帳に記録（更新と同じコミットで）
+        with unit_of_work():
+            StockMovement.record_many([StockMovement.build(
+                textbook.id, (textbook.stock_quantity or 0) - old_stock, 'adjust', note=f'admin:{user_id}'
+            )])
+            textbook.save()
         return jsonify({
             'message': 'Textbook updated successfully',
             'textbook': textbook.to_dict()
@@ -113,9 +180,7 @@ def update_textbook(textbook_id):
 @jwt_required()
 def delete_textbook(textbook_id):
     try:
-        user_id = get_jwt_identity()
-        user = User.find_by_id(user_id)
-        if not user or user.role != 'admin':
+        if not is_admin():
             return jsonify({'error': 'Admin access required'}), 403
         
         textbook = Textbook.query.get(textbook_id)